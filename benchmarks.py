@@ -0,0 +1,617 @@
+"""
+ダメージ計算機の性能計測スクリプト。
+
+    python benchmarks.py            # 全ベンチマークを実行
+    python benchmarks.py team_io    # 指定したものだけ実行
+    python benchmarks.py checks     # 高速化した計算の正しさの確認だけ実行
+"""
+import copy
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import damage_calc as dc
+
+# 計測では毎回計算させる (計算結果の永続キャッシュは bench_result_cache でだけ使う)
+os.environ[dc.RESULT_CACHE_ENV_VAR] = "off"
+
+
+def _timeit(func, repeat=3):
+    """func を repeat 回実行し、最速の所要時間 (秒) と最後の戻り値を返す"""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _sample_pokemon(i):
+    return {
+        'id': str(i), 'name': f"ポケモン{i}", 'level': 50 + i % 51,
+        **{f'{s}_base': 40 + (i * 7 + j * 13) % 120 for j, s in enumerate(dc.STAT_KEYS)},
+        **{f'{s}_iv': dc.IV_CHOICES[(i + j) % len(dc.IV_CHOICES)] for j, s in enumerate(dc.STAT_KEYS)},
+        'att_stat_name': '攻撃' if i % 2 else '特攻',
+        'def_stat_name': '防御' if i % 2 else '特防',
+    }
+
+
+def bench_team_io(n=10_000):
+    """チームセット 1万件のパース速度"""
+    pokemons = [_sample_pokemon(i) for i in range(n)]
+    for fmt, export in [("Showdown形式 (テキスト)", dc.export_team_paste), ("JSON Lines", dc.export_team_jsonl)]:
+        lines = export(pokemons).splitlines()
+        elapsed, (parsed, errors) = _timeit(lambda: dc.import_team_sets(lines, fmt))
+        assert len(parsed) == n and not errors
+        print(f"  {fmt}: {n} 件 {elapsed * 1000:.1f} ms ({n / elapsed:,.0f} 件/秒)")
+
+
+class _SessionState(dict):
+    """st.session_state の代わりに使う、属性アクセス可能な辞書"""
+    __getattr__ = dict.__getitem__
+    __setattr__ = dict.__setitem__
+
+
+def _traced_bytes(func):
+    """func 実行中に確保され、終了後も残っているメモリ量 (バイト) を返す"""
+    tracemalloc.start()
+    kept = func()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return current
+
+
+def bench_sessions(n=500):
+    """500 セッション同時接続時のセッションステートのメモリ量"""
+    dc.get_default_pokemons()  # 共有データはプロセスで1度だけ作られる
+
+    def legacy_sessions():
+        # 旧実装: セッションごとに初期データと選択肢リストを複製していた
+        sessions = []
+        for _ in range(n):
+            pokemons = [
+                copy.deepcopy({**p, 'id': str(i), 'moves': [dict(m) for m in p['moves']]})
+                for i, p in enumerate(dc.get_default_pokemons())
+            ]
+            choices = ["直接実数値入力"] + ["マイポケモン: " + p['name'] for p in pokemons]
+            sessions.append({'my_pokemons': pokemons, 'VIRTUAL_P_CHOICES': choices})
+        return sessions
+
+    def shared_sessions():
+        sessions = []
+        original = dc.st.session_state
+        try:
+            for _ in range(n):
+                dc.st.session_state = _SessionState()
+                dc.initialize_session_state()
+                sessions.append(dc.st.session_state)
+        finally:
+            dc.st.session_state = original
+        return sessions
+
+    dc.get_default_virtual_p_choices()
+    legacy = _traced_bytes(legacy_sessions)
+    shared = _traced_bytes(shared_sessions)
+    print(f"  複製 (旧): {legacy / 1024:.1f} KiB ({legacy / n:.0f} B/セッション)")
+    print(f"  共有 (新): {shared / 1024:.1f} KiB ({shared / n:.0f} B/セッション)")
+
+
+def bench_sweep():
+    """育成スイープ (レベル × 努力値 / 努力値 × 努力値) の全マス計算時間"""
+    for axis in dc.SWEEP_AXIS_CHOICES:
+        elapsed, grid = _timeit(lambda: dc.compute_sweep_grid(
+            axis, 50, 100, 1.5 * 2.0,
+            130, 1.1, 1.0, dc.IV_CHOICES[2],
+            100, 252, 1.0, 1.0, dc.IV_CHOICES[0],
+            90, 252, dc.IV_CHOICES[0],
+        ), repeat=10)
+        ko_elapsed, _ = _timeit(lambda: dc.sweep_ko_thresholds(grid, largest=axis == dc.SWEEP_AXIS_CHOICES[1]), repeat=10)
+        print(f"  {axis}: {len(grid)} マス {elapsed * 1000:.2f} ms (KO 閾値 {ko_elapsed * 1000:.2f} ms)")
+
+
+def bench_raid(trials=20_000):
+    """レイドシミュレーター (4体 vs ボス) の1コアあたりのスループット"""
+    attackers = [
+        {'name': f"アタッカー{i}", 'level': 50, 'attack': 150 + 10 * i, 'power': 90, 'final_ratio': 1.5 * 2.0,
+         'cast_time': 1.0, 'cooldown': 3.0 + 0.5 * i, 'start_delay': 0.0, 'jitter': 0.5}
+        for i in range(4)
+    ]
+    for boss_hp in (1500, 3000):
+        boss = {'hp': boss_hp, 'defense': 150}
+        elapsed, times = _timeit(lambda: dc.run_raid_monte_carlo(attackers, boss, trials, seed=0), repeat=1)
+        print(f"  ボスHP {boss_hp}: {trials / elapsed:,.0f} 戦/秒 (討伐時間の中央値 {float(dc.np.nanmedian(times)):.1f} 秒)")
+
+
+def bench_result_table(n=1_000_000):
+    """100万行の結果テーブル: 整形済み文字列の辞書リスト vs 数値テーブル"""
+    rng = dc.np.random.default_rng(0)
+    dmg_max = rng.integers(1, 400, n)
+    dmg_min = dc.np.floor(dmg_max * 0.85).astype(dc.np.int64)
+    hp = rng.integers(100, 400, n)
+    names = [f"敵{i % 500}" for i in range(n)]
+    conditions = ["攻A MAX", "攻A MIN"] * (n // 2)
+
+    def legacy_rows():
+        # 旧実装: 1行ごとに長い日本語列名の辞書と整形済み文字列を持つ
+        return [
+            {'敵ポケモン': name, '条件': cond, 'ZAダメ幅 (攻A MAX)': f"{lo}～{hi}", 'ZA TTK (攻A MAX)': dc.calculate_ttk(lo, hi, h)}
+            for name, cond, lo, hi, h in zip(names, conditions, dmg_min.tolist(), dmg_max.tolist(), hp.tolist())
+        ]
+
+    def numeric_frame():
+        return dc.build_damage_result_frame(dmg_min, dmg_max, hp, labels={'name': names, 'condition': conditions})
+
+    legacy_time, rows = _timeit(legacy_rows, repeat=1)
+    del rows
+    legacy_bytes = _traced_bytes(legacy_rows)
+    numeric_time, frame = _timeit(numeric_frame, repeat=1)
+    numeric_bytes = int(frame.memory_usage(deep=True).sum())
+    page_time, _ = _timeit(lambda: dc.format_damage_result_rows(frame.sort_values('hits_max').iloc[:dc.RESULT_DISPLAY_PAGE_SIZE], {}))
+
+    print(f"  辞書リスト (旧): {legacy_bytes / 2**20:.1f} MiB, 作成 {legacy_time:.2f} 秒")
+    print(f"  数値テーブル (新): {numeric_bytes / 2**20:.1f} MiB, 作成 {numeric_time:.2f} 秒")
+    print(f"  並べ替え + 1ページ ({dc.RESULT_DISPLAY_PAGE_SIZE}行) の整形: {page_time * 1000:.1f} ms")
+
+
+def bench_modifier_sweep():
+    """補正組み合わせスイープ (全組み合わせ、実効倍率で重複除外)"""
+    labels, ratio, effective_keys, inverse = dc.get_modifier_combinations()
+    elapsed, frame = _timeit(lambda: dc.evaluate_modifier_sweep(50, 100, 150, 130, 200), repeat=10)
+    print(f"  {len(inverse):,} 通り → 実効倍率 {len(effective_keys):,} 通り: {elapsed * 1000:.2f} ms")
+
+
+def bench_team_optimizer(n=100):
+    """チーム選出最適化 (マイポケモン100体のうち30体を仮想敵にし、残り70体から6体選出)"""
+    pokemons = [_sample_pokemon(i) for i in range(n)]
+    threat_indices = set(range(0, n, n // 30)[:30])
+    threats = [pokemons[i] for i in sorted(threat_indices)]
+    members = [p for i, p in enumerate(pokemons) if i not in threat_indices]
+    elapsed, (offense, defense) = _timeit(lambda: dc.team_pairwise_hits(
+        members, threats, {'A': 252, 'C': 252}, {'H': 0, 'B': 0, 'D': 0}, default_power=90
+    ), repeat=1)
+    print(f"  ダメージ行列 {len(members)}×{len(threats)} (双方向): {elapsed:.2f} 秒")
+    for objective in dc.TEAM_OBJECTIVE_CHOICES:
+        elapsed, (team, score, nodes) = _timeit(lambda: dc.optimize_team(offense, defense, 6, objective, ko_hits=2), repeat=1)
+        print(f"  {objective}: {elapsed:.2f} 秒 ({nodes:,} ノード, スコア {score:g})")
+
+
+def bench_calc_log(n=100_000):
+    """計算ログ 10万件の記録と、現在の計算エンジンでのリプレイ速度"""
+    args = [(50 + i % 51, 40 + i % 120, 80 + i % 150, 70 + (i * 7) % 160, 120 + (i * 11) % 200, 1.5 if i % 3 else 1.0)
+            for i in range(n)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'calc_log.jsonl')
+        os.environ[dc.CALC_LOG_ENV_VAR] = path
+        try:
+            elapsed, _ = _timeit(lambda: [dc.perform_damage_calc(*a) for a in args], repeat=1)
+        finally:
+            del os.environ[dc.CALC_LOG_ENV_VAR]
+        print(f"  記録: {elapsed:.2f} 秒 ({n / elapsed:,.0f} 件/秒, {os.path.getsize(path) / n:.0f} バイト/件)")
+        with open(path, encoding='utf-8') as f:
+            report = dc.replay_calculation_log(f)
+    print(f"  リプレイ: {report['seconds']:.2f} 秒 ({report['count'] / report['seconds']:,.0f} 件/秒, 差分 {report['n_diffs']} 件)")
+
+
+def bench_za_fit(n=1_000):
+    """ZA補正係数フィッティング (実測1000件 × 分子4096通り)"""
+    rng = dc.np.random.default_rng(0)
+    rows = []
+    for i in range(n):
+        level, power = 50 + i % 51, 40 + (i * 7) % 120
+        attack, defense = 80 + (i * 13) % 170, 70 + (i * 17) % 160
+        modifier = (1.0, 1.5, 2.0, 0.5)[i % 4]
+        lo, hi = dc.compute_damage_range(level, power, attack, defense, modifier)
+        rows.append(f"{level},{power},{attack},{defense},{modifier},{rng.integers(lo, hi + 1)},{'レイド' if i % 2 else '通常'}")
+    text = "level,power,attack,defense,modifier,damage,context\n" + "\n".join(rows)
+    elapsed, (observations, _) = _timeit(lambda: dc.load_damage_observations(text))
+    print(f"  CSV読み込み: {elapsed * 1000:.1f} ms")
+    for by_context in (False, True):
+        elapsed, fit = _timeit(lambda: dc.fit_za_correction_ratio(observations, by_context=by_context))
+        ranges = {g: dc.consistent_numerator_ranges(fit, g) for g in fit['context'].cat.categories}
+        print(f"  状況別={by_context}: {elapsed * 1000:.0f} ms, 全観測と一致する分子 {ranges}")
+
+
+def bench_roster_index(n=10_000, queries=1_000):
+    """確定数インデックス (マイポケモン1万体) の構築と検索、全件計算との比較"""
+    pokemons = [_sample_pokemon(i) for i in range(n)]
+    elapsed, index = _timeit(lambda: dc.build_roster_stat_index(pokemons, 50, 252, 0, 0))
+    print(f"  インデックス構築: {elapsed * 1000:.1f} ms")
+
+    category = dc.MOVE_CATEGORY_CHOICES[0]
+    targets = [(60 + i % 160, 120 + (i * 7) % 200) for i in range(queries)]
+
+    def full_scan(defense, hp):
+        damage = dc.calculate_damage_base_np(50, 100, index['A_min'], defense, 1.5, is_za=True)
+        return dc.np.flatnonzero(dc.np.floor(damage * 0.85) >= hp)
+
+    for label, query in [
+        ("倒せるマイポケモン (二分探索)", lambda d, h: dc.query_ko_attackers(index, category, d, h, 100, 1.5)[1]),
+        ("倒せるマイポケモン (全件計算)", full_scan),
+        ("耐えるマイポケモン (HPごとに二分探索)", lambda a, h: dc.query_surviving_defenders(index, category, a, 100, 1.5)[1]),
+    ]:
+        elapsed, _ = _timeit(lambda: [query(d, h) for d, h in targets])
+        print(f"  {label}: {elapsed / queries * 1e6:,.1f} µs/クエリ")
+
+
+def bench_result_cache(n=60):
+    """計算結果の永続キャッシュ (マイポケモン60体の技セットマトリクス): 計算 / 再起動後のディスク読み込み / st.cache_data"""
+    import streamlit as st
+
+    pokemons = [_sample_pokemon(i) for i in range(n)]
+    args = (pokemons, pokemons, {'A': 252, 'C': 252}, {'H': 0, 'B': 0, 'D': 0})
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ[dc.RESULT_CACHE_ENV_VAR] = os.path.join(tmp, 'results.sqlite3')
+        try:
+            elapsed, _ = _timeit(lambda: dc.best_move_matrix(*args), repeat=1)
+            print(f"  初回 (計算して保存): {elapsed * 1000:.1f} ms")
+            # 再起動を模して接続を捨て、新しい接続からディスク上の結果を読む
+            dc._result_cache_local.__dict__.clear()
+            elapsed, _ = _timeit(lambda: dc.best_move_matrix(*args), repeat=1)
+            print(f"  再起動後の初回 (ディスクから): {elapsed * 1000:.2f} ms")
+            elapsed, _ = _timeit(lambda: dc.best_move_matrix(*args), repeat=20)
+            print(f"  2回目以降 (ディスクから): {elapsed * 1000:.2f} ms")
+        finally:
+            dc._result_cache_local.__dict__.clear()
+            os.environ[dc.RESULT_CACHE_ENV_VAR] = "off"
+
+    in_memory = st.cache_data(dc.best_move_matrix.__wrapped__)
+    in_memory(*args)
+    elapsed, _ = _timeit(lambda: in_memory(*args), repeat=20)
+    print(f"  参考: st.cache_data (メモリ) のヒット: {elapsed * 1000:.2f} ms")
+
+
+def bench_duels(n=100, n_threats=30):
+    """1対1 勝率ソルバー (マイポケモン100体 × 仮想敵30体、乱数16段階の厳密計算)"""
+    pokemons = [_sample_pokemon(i) for i in range(n)]
+    threats = pokemons[::n // n_threats][:n_threats]
+    ev = {'A': 252, 'C': 252, 'S': 252}
+    elapsed, results = _timeit(lambda: dc.solve_duels(pokemons, threats, ev), repeat=1)
+    print(f"  {len(results):,} 組: {elapsed:.2f} 秒 ({len(results) / elapsed:,.0f} 組/秒, 勝率が0/1以外の組 {((results['win'] > 0) & (results['win'] < 1)).sum()})")
+
+
+def _legacy_roster_script():
+    # 旧実装: 登録ポケモンごとに削除ボタンとエキスパンダーを描画していた
+    import streamlit as st
+
+    import benchmarks
+    st.session_state.setdefault('my_pokemons', [benchmarks._sample_pokemon(i) for i in range(benchmarks.ROSTER_BENCH_SIZE)])
+    for i, p in enumerate(st.session_state.my_pokemons):
+        st.sidebar.button("削除", key=f"delete_btn_{p['id']}")
+        with st.sidebar.expander(f"No.{i+1} : **{p['name']}**"):
+            st.caption(f"Lv: {p.get('level', 50)}")
+            st.caption("--- 種族値/個体値 ---")
+            st.caption(", ".join(f"{s} B:{p[f'{s}_base']} I:{p[f'{s}_iv'][:5]}" for s in ['H', 'A', 'B', 'C', 'D', 'S']))
+
+
+def _paged_roster_script():
+    import streamlit as st
+
+    import benchmarks
+    import damage_calc as dc
+    st.session_state.setdefault('my_pokemons', [benchmarks._sample_pokemon(i) for i in range(benchmarks.ROSTER_BENCH_SIZE)])
+    dc.display_pokemon_list()
+
+
+ROSTER_BENCH_SIZE = 1000
+
+
+def bench_roster():
+    """サイドバーのマイポケモン一覧 (1000体登録) の再描画時間と要素数"""
+    from streamlit.testing.v1 import AppTest
+
+    for label, script in [("旧: 1体ごとにボタン+エキスパンダー", _legacy_roster_script), ("新: 検索+ページ送り", _paged_roster_script)]:
+        at = AppTest.from_function(script, default_timeout=600)
+        at.run()  # 初回はセッションの準備を含むので計測しない
+        elapsed, _ = _timeit(at.run)
+        n_elements = sum(1 for _ in at.sidebar)
+        print(f"  {label}: 再描画 {elapsed * 1000:,.0f} ms, サイドバーの要素 {n_elements:,} 個")
+
+
+# --- 正しさの確認: 高速化した計算を、1件ずつの素直な計算 (スカラー版・総当たり) と突き合わせる ---
+def check_sweep(trials=20, samples=200):
+    """育成スイープ (numpy) の各マスと KO 閾値が、詳細モードのスカラー計算と一致するか"""
+    rng = random.Random(0)
+    for trial in range(trials):
+        axis = dc.SWEEP_AXIS_CHOICES[trial % 2]
+        level, power = rng.randint(1, 100), rng.randint(10, 250)
+        ratio = rng.choice([0.25, 0.5, 1.0, 1.2 * 1.5, 1.5 * 2.0 * 1.3 * 0.5, 4.0 * 1.5 * 1.5 * 1.3])
+        attacker = (rng.randint(5, 200), rng.choice([0.9, 1.0, 1.1]), rng.choice([1.0, 1.5]), rng.choice(dc.IV_CHOICES))
+        defender = (rng.randint(5, 200), rng.randrange(0, 253, 4), rng.choice([0.9, 1.0, 1.1]), rng.choice([1.0, 1.5]),
+                    rng.choice(dc.IV_CHOICES))
+        hp = (rng.randint(1, 200), rng.randrange(0, 253, 4), rng.choice(dc.IV_CHOICES))
+        grid = dc.compute_sweep_grid(axis, level, power, ratio, *attacker, *defender, *hp)
+
+        def scalar(x, y):
+            lv, d_ev = (y, defender[1]) if axis == dc.SWEEP_AXIS_CHOICES[0] else (level, y)
+            return dc.compute_detailed_result(lv, power, attacker[0], x, *attacker[1:],
+                                              defender[0], d_ev, *defender[2:], *hp, ratio)
+
+        for row in grid.sample(samples, random_state=trial).itertuples():
+            expected = scalar(row.x, row.y)
+            assert (row.dmg_min, row.dmg_max, row.hp) == (expected['dmg_min'], expected['dmg_max'], expected['hp_max']), (axis, row, expected)
+            assert (row.hits_min, row.hits_max) == dc.calculate_ttk_hits(row.dmg_min, row.dmg_max, row.hp), (axis, row)
+
+        # KO 閾値: レベル軸は確定 n 発になる最小のレベル、防御努力値軸は確定 n 発が維持される最大の努力値
+        largest = axis == dc.SWEEP_AXIS_CHOICES[1]
+        thresholds = dc.sweep_ko_thresholds(grid, largest=largest)
+        hits = {}
+        for x, y in zip(grid['x'], grid['y']):
+            expected = scalar(x, y)
+            hits[x, y] = dc.calculate_ttk_hits(expected['dmg_min'], expected['dmg_max'], expected['hp_max'])[1]
+        for n in dc.SWEEP_KO_HITS:
+            found = thresholds[thresholds['ko'] == f"確定{n}発"].set_index('x')['y'].to_dict()
+            for x in dc.SWEEP_EV_VALUES:
+                ys = [y for (hx, y), h in hits.items() if hx == x and 0 < h <= n]
+                expected = (max(ys) if largest else min(ys)) if ys else None
+                assert found.get(x) == expected, (axis, n, x, found.get(x), expected)
+    return trials
+
+
+def check_team_optimizer(n_members=16, n_threats=10):
+    """チーム選出最適化 (分枝限定法) の最適スコアが、全組み合わせの総当たりと一致するか"""
+    pokemons = [_sample_pokemon(i) for i in range(n_members + n_threats)]
+    members, threats = pokemons[:n_members], pokemons[n_members:]
+    offense, defense = dc.team_pairwise_hits(members, threats, {'A': 252, 'C': 252}, {'H': 0, 'B': 0, 'D': 0}, default_power=90)
+    cases = 0
+    for team_size, ko_hits, objective in itertools.product(dc.TEAM_SIZE_CHOICES, (1, 2), dc.TEAM_OBJECTIVE_CHOICES):
+        w_cov, w_ohko = dc.team_objective_weights(objective, n_threats, team_size, (1.0, 0.5))
+
+        def score(team):
+            covered = ((offense[list(team)] > 0) & (offense[list(team)] <= ko_hits)).any(axis=0).sum()
+            return w_cov * int(covered) - w_ohko * int((defense[:, list(team)] == 1).sum())
+
+        team, best, _ = dc.optimize_team(offense, defense, team_size, objective, ko_hits, (1.0, 0.5))
+        expected = max(score(t) for t in itertools.combinations(range(n_members), team_size))
+        assert len(set(team)) == team_size and score(team) == best == expected, (team_size, ko_hits, objective, best, expected)
+        cases += 1
+    return cases
+
+
+def check_calc_log():
+    """計算ログ: 簡単モードと対戦シミュレーションの計算がログに残り、現在の計算エンジンでのリプレイと一致するか"""
+    from streamlit.testing.v1 import AppTest
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'calc_log.jsonl')
+        os.environ[dc.CALC_LOG_ENV_VAR] = path
+        try:
+            at = AppTest.from_file(dc.__file__, default_timeout=120)
+            at.run()
+            next(b for b in at.button if b.label == "計算を実行").click().run()  # 簡単モード
+            at.radio(key="main_mode_select").set_value("対戦シミュレーションモード").run()
+            for sim_mode in at.radio(key="sim_mode_select").options:
+                at.radio(key="sim_mode_select").set_value(sim_mode).run()
+                at.button(key="run_sim_calc").click().run()
+                assert not at.exception, [e.value for e in at.exception]
+            sim_rows = len(at.session_state['sim_results'])
+        finally:
+            del os.environ[dc.CALC_LOG_ENV_VAR]
+        with open(path, encoding='utf-8') as f:
+            lines = f.readlines()
+        with open(path, encoding='utf-8') as f:
+            report = dc.replay_calculation_log(f)
+
+    kinds = [json.loads(line)['kind'] for line in lines]
+    assert kinds.count('damage') == 1 and kinds.count('battle_sim') >= 2 * sim_rows, kinds
+    assert report['n_diffs'] == 0 and not report['errors'], report
+    return len(lines)
+
+
+def check_za_fit(n=40):
+    """ZA補正係数フィッティング (全観測 × 全分子の一括評価) が、ZA補正係数を差し替えたスカラー計算と一致するか"""
+    rng = random.Random(0)
+    rows = []
+    for i in range(n):
+        level, power = rng.randint(1, 100), rng.randint(10, 250)
+        attack, defense = rng.randint(20, 400), rng.randint(20, 400)
+        modifier = rng.choice([1.0, 1.5, 2.0, 0.5, 2.25])
+        lo, hi = dc.compute_damage_range(level, power, attack, defense, modifier)
+        damage = max(0, rng.randint(lo, hi) + rng.choice([0, 0, 0, -3, 2]))  # 一部は仮説と合わない観測にする
+        rows.append(f"{level},{power},{attack},{defense},{modifier},{damage},{'レイド' if i % 3 else '通常'}")
+    observations, errors = dc.load_damage_observations("level,power,attack,defense,modifier,damage,context\n" + "\n".join(rows))
+    assert not errors and len(observations) == n, errors
+
+    numerators = range(1, dc.ZA_FIT_DENOMINATOR + 1)
+    residuals = {}
+    original_ratio = dc.ZA_CORRECTION_RATIO
+    try:
+        for numerator in numerators:
+            dc.ZA_CORRECTION_RATIO = numerator / dc.ZA_FIT_DENOMINATOR
+            for obs in observations.itertuples():
+                lo, hi = dc.compute_damage_range(obs.level, obs.power, obs.attack, obs.defense, obs.modifier)
+                residuals[numerator, obs.Index] = obs.damage - min(max(obs.damage, lo), hi)
+    finally:
+        dc.ZA_CORRECTION_RATIO = original_ratio
+
+    for by_context in (False, True):
+        fit = dc.fit_za_correction_ratio(observations, numerators, by_context=by_context)
+        assert len(fit) == len(numerators) * (observations['context'].nunique() if by_context else 1)
+        for row in fit.itertuples():
+            rows = observations.index if not by_context else observations.index[observations['context'] == row.context]
+            r = [residuals[row.numerator, i] for i in rows]
+            expected = (len(r), sum(v == 0 for v in r), sum(map(abs, r)), max(map(abs, r)))
+            actual = (row.n_obs, row.consistent, row.abs_residual_sum, row.abs_residual_max)
+            assert actual == expected and abs(row.residual_mean - sum(r) / len(r)) < 1e-9, (by_context, row, expected)
+    return n * len(numerators)
+
+
+def check_roster_index(n=2_000, queries=40):
+    """確定数インデックスの検索結果と境界値が、全員を1体ずつスカラー計算した総当たりと一致するか"""
+    level, att_ev, def_ev, h_ev = 50, 252, 0, 4
+    pokemons = [_sample_pokemon(i) for i in range(n)]
+    index = dc.build_roster_stat_index(pokemons, level, att_ev, def_ev, h_ev)
+
+    def stat(p, s, bound):
+        iv = dc.get_iv_range(p[f'{s}_iv'])[0 if bound == 'min' else 1]
+        if s == 'H':
+            return dc.calculate_hp_value(p['H_base'], iv, h_ev, level)
+        return dc.calculate_stat_value(p[f'{s}_base'], iv, att_ev if s in ('A', 'C') else def_ev, level, 1.0, 1.0)
+
+    rng = random.Random(0)
+    for _ in range(queries):
+        category = rng.choice(dc.MOVE_CATEGORY_CHOICES)
+        guaranteed, hits = rng.random() < 0.5, rng.randint(1, 3)
+        power, ratio = rng.choice([40, 80, 120]), rng.choice([0.5, 1.0, 1.5, 2.25])
+        bound = 'min' if guaranteed else 'max'
+        physical = category == dc.MOVE_CATEGORY_CHOICES[0]
+
+        # 倒せる側: 確定なら乱数最小・個体値最小、乱数なら乱数最大・個体値最大で hp に届くか
+        defense, hp = rng.randint(50, 250), rng.randint(100, 300)
+        att_stat = 'A' if physical else 'C'
+        attack_of = {i: stat(p, att_stat, bound) for i, p in enumerate(pokemons)}
+        expected = {i for i, a in attack_of.items()
+                    if dc.compute_damage_range(level, power, a, defense, ratio)[0 if guaranteed else 1] * hits >= hp}
+        _, found = dc.query_ko_attackers(index, category, defense, hp, power, ratio, hits, guaranteed)
+        assert set(found.tolist()) == expected, ('ko', category, guaranteed, len(found), len(expected))
+        assert all(attack_of[i] >= attack_of[j] for i, j in zip(found, found[1:])), 'ko order'
+        ko = lambda a: dc.compute_damage_range(level, power, a, defense, ratio)[0 if guaranteed else 1] * hits >= hp
+        threshold = dc.min_ko_attack(level, power, defense, hp, ratio, hits, guaranteed)
+        assert threshold and ko(threshold) and (threshold == 1 or not ko(threshold - 1)), ('min_ko_attack', threshold)
+
+        # 耐える側: 確定耐えなら乱数最大・個体値最小、乱数耐えなら乱数最小・個体値最大でも hp が残るか
+        attack = rng.randint(50, 250)
+        def_stat = 'B' if physical else 'D'
+        defense_of = {i: stat(p, def_stat, bound) for i, p in enumerate(pokemons)}
+        expected = {i for i, p in enumerate(pokemons)
+                    if dc.compute_damage_range(level, power, attack, defense_of[i], ratio)[1 if guaranteed else 0] * hits < stat(p, 'H', bound)}
+        _, found = dc.query_surviving_defenders(index, category, attack, power, ratio, hits, guaranteed)
+        assert set(found.tolist()) == expected, ('survive', category, guaranteed, len(found), len(expected))
+        assert all(defense_of[i] >= defense_of[j] for i, j in zip(found, found[1:])), 'survive order'
+        survives = lambda d: dc.compute_damage_range(level, power, attack, d, ratio)[1 if guaranteed else 0] * hits < hp
+        threshold = dc.min_surviving_defense(level, power, attack, hp, ratio, hits, guaranteed)
+        if threshold is not None:
+            assert survives(threshold) and (threshold == 1 or not survives(threshold - 1)), ('min_surviving_defense', threshold)
+    return queries * 2
+
+
+def _duel_markov_reference(table_a, table_b, hp_a, hp_b, speed_order, max_turns):
+    """(a の HP, b の HP) の同時分布をターンごとに進める素直なマルコフ連鎖で (勝率, 負け率, 決着なし) を求める"""
+    win = lose = 0.0
+
+    def strike(states, a_attacks):
+        nonlocal win, lose
+        table = table_a if a_attacks else table_b
+        after = {}
+        for (x, y), p in states.items():
+            for d in table:
+                p_roll = p / len(table)
+                if a_attacks and y - d <= 0:
+                    win += p_roll
+                elif not a_attacks and x - d <= 0:
+                    lose += p_roll
+                else:
+                    key = (x, y - d) if a_attacks else (x - d, y)
+                    after[key] = after.get(key, 0.0) + p_roll
+        return after
+
+    states = {(hp_a, hp_b): 1.0}
+    for _ in range(max_turns):
+        if speed_order != 0:
+            a_first = speed_order > 0
+            states = strike(strike(states, a_first), not a_first)
+        else:
+            # 同速はターンごとに 1/2 で行動順が決まる
+            half = {k: p / 2 for k, p in states.items()}
+            states = strike(strike(half, True), False)
+            for k, p in strike(strike(half, False), True).items():
+                states[k] = states.get(k, 0.0) + p
+    return win, lose, sum(states.values())
+
+
+def check_duels(n_members=30, n_threats=20, max_guaranteed_hits=8):
+    """1対1 勝率ソルバーの技選択・ダメージ表・勝率が、スカラー計算と同時分布のマルコフ連鎖と一致するか"""
+    pokemons = [_sample_pokemon(i) for i in range(n_members + n_threats)]
+    for i, p in enumerate(pokemons):
+        if i % 3 == 0:
+            p['moves'] = [
+                {'name': "物理技", 'power': 60 + i % 60, 'category': dc.MOVE_CATEGORY_CHOICES[0], 'type': '', 'stab': i % 2 == 0, 'tech_plus': True},
+                {'name': "特殊技", 'power': 120 - i % 60, 'category': dc.MOVE_CATEGORY_CHOICES[1], 'type': '', 'stab': i % 2 == 1, 'tech_plus': False},
+            ]
+        elif i % 5 == 4:
+            # 乱数最小で0ダメージになる技同士で、DUEL_MAX_TURNS までに決着しない組を作る
+            p['moves'] = [{'name': "弱い技", 'power': 1, 'category': dc.MOVE_CATEGORY_CHOICES[0], 'type': '', 'stab': False, 'tech_plus': False}]
+        if i % 4 == 0:
+            # 同速の組を作る
+            p.update(level=50, S_base=pokemons[0]['S_base'], S_iv=pokemons[0]['S_iv'])
+    members, threats = pokemons[:n_members], pokemons[n_members:]
+    ev, tech_plus_mod = {'A': 252, 'C': 252, 'S': 252}, 1.2
+    results = dc.solve_duels(members, threats, ev, tech_plus_mod=tech_plus_mod)
+    profile_a = dc.duel_profiles(members, ev, dc.DUEL_IV_BOUND_CHOICES[0], tech_plus_mod=tech_plus_mod)
+    profile_b = dc.duel_profiles(threats, ev, dc.DUEL_IV_BOUND_CHOICES[0], tech_plus_mod=tech_plus_mod)
+
+    def scalar_table(attacker, profile_att, i, profile_def, j):
+        """技ごとに compute_damage_range で最大ダメージを求め、最も大きい技の乱数16段階を返す"""
+        best = 0
+        for move in attacker.get('moves') or [dc._generic_move(attacker, 80)]:
+            physical = move['category'] == dc.MOVE_CATEGORY_CHOICES[0]
+            ratio = (1.5 if move['stab'] else 1.0) * (tech_plus_mod if move['tech_plus'] else 1.0)
+            attack = profile_att['A' if physical else 'C'][i]
+            defense = profile_def['B' if physical else 'D'][j]
+            best = max(best, dc.compute_damage_range(attacker['level'], move['power'], attack, defense, ratio)[1])
+        return [best * r // 100 for r in dc.RAID_DAMAGE_ROLLS]
+
+    checked = 0
+    for row in results.itertuples():
+        i, j = divmod(row.Index, n_threats)
+        table_a = scalar_table(members[i], profile_a, i, profile_b, j)
+        table_b = scalar_table(threats[j], profile_b, j, profile_a, i)
+        hp_a, hp_b = int(profile_a['H'][i]), int(profile_b['H'][j])
+        speed_a, speed_b = int(profile_a['S'][i]), int(profile_b['S'][j])
+        speed_order = (speed_a > speed_b) - (speed_a < speed_b)
+        assert row.speed_order == speed_order, row
+        # 参照のマルコフ連鎖は状態数が発数とともに増えるため、短期決戦 (または片方が0ダメージ) の組だけ突き合わせる
+        if any(t[0] > 0 and -(-hp // t[0]) > max_guaranteed_hits for t, hp in ((table_a, hp_b), (table_b, hp_a))):
+            continue
+        expected = _duel_markov_reference(table_a, table_b, hp_a, hp_b, speed_order, dc.DUEL_MAX_TURNS)
+        assert all(abs(x - y) < 1e-9 for x, y in zip((row.win, row.lose, row.draw), expected)), (row, expected)
+        checked += 1
+    assert checked >= len(results) // 2, checked
+    return checked
+
+
+CHECKS = {
+    'sweep': check_sweep,
+    'team_optimizer': check_team_optimizer,
+    'calc_log': check_calc_log,
+    'za_fit': check_za_fit,
+    'roster_index': check_roster_index,
+    'duels': check_duels,
+}
+
+
+def run_checks():
+    """高速化した計算の正しさの確認 (numpy・索引・専用ソルバーと、1件ずつの素直な計算の突き合わせ)"""
+    for name, check in CHECKS.items():
+        elapsed, cases = _timeit(check, repeat=1)
+        print(f"  {name}: OK ({cases:,} ケース, {elapsed:.1f} 秒)")
+
+
+BENCHMARKS = {
+    'team_io': bench_team_io,
+    'sessions': bench_sessions,
+    'sweep': bench_sweep,
+    'raid': bench_raid,
+    'result_table': bench_result_table,
+    'modifier_sweep': bench_modifier_sweep,
+    'team_optimizer': bench_team_optimizer,
+    'calc_log': bench_calc_log,
+    'roster': bench_roster,
+    'za_fit': bench_za_fit,
+    'roster_index': bench_roster_index,
+    'result_cache': bench_result_cache,
+    'duels': bench_duels,
+    'checks': run_checks,
+}
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"[{name}] {BENCHMARKS[name].__doc__}")
+        BENCHMARKS[name]()
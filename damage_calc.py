@@ -1,7 +1,26 @@
 import streamlit as st
+import functools
+import hashlib
+import heapq
+import importlib
+import inspect
+import io
+import itertools
+import json
 import math
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+import unicodedata
 import uuid
+from concurrent.futures import ProcessPoolExecutor
+from types import MappingProxyType
 import pandas as pd
+import numpy as np
+import altair as alt
 
 # --- 1. 共通定数 ---
 ZA_CORRECTION_RATIO = 2868 / 4096 # ZA補正係数
@@ -45,12 +64,22 @@ OTHER_ITEM_FIELD_MODIFIER_CHOICES = {
     "その他 (任意)": 1.0, 
 }
 TECHNIQUE_CATEGORY_CHOICES = ["物理 (A vs B)", "特殊 (C vs D)"]
+MOVE_CATEGORY_CHOICES = ("物理", "特殊")
+MAX_MOVES = 4
+BEST_MOVE_CRITERIA = ("最小ダメージが最大", "確定数が最少")
 WALL_MODIFIER = 0.5
 
-IV_CHOICES = list(IV_RANGES.keys())
-NATURE_CHOICES = list(NATURE_MODIFIERS.keys())
-BATTLE_CHOICES = list(BATTLE_MODIFIERS.keys())
-TECHNIQUE_PLUS_CHOICES = list(TECHNIQUE_PLUS_MODIFIERS.keys())
+# 選択肢は読み取り専用のタプルとして保持する (セッション間で共有しても安全)
+IV_CHOICES = tuple(IV_RANGES.keys())
+NATURE_CHOICES = tuple(NATURE_MODIFIERS.keys())
+BATTLE_CHOICES = tuple(BATTLE_MODIFIERS.keys())
+TECHNIQUE_PLUS_CHOICES = tuple(TECHNIQUE_PLUS_MODIFIERS.keys())
+
+# 個体値 (0～31) から該当する選択肢を引く表
+IV_CHOICE_BY_VALUE = tuple(
+    next(choice for choice, (iv_min, iv_max) in IV_RANGES.items() if iv_min <= iv <= iv_max)
+    for iv in range(32)
+)
 
 # --- 1.5 共通インデックス取得 ---
 STAB_1_0_INDEX = list(STAB_CHOICES.keys()).index("タイプ不一致 (1.0倍)")
@@ -93,27 +122,35 @@ def calculate_damage_base(level, power, attack, defense, correction_ratio_no_rng
     
     return final_damage_max
 
-def calculate_ttk(min_dmg, max_dmg, hp):
-    """TTK (Time To Knockout) を計算する"""
-    if hp <= 0 or min_dmg <= 0: return "N/A"
-    
-    max_hits = math.ceil(hp / min_dmg)
-    min_hits = math.ceil(hp / max_dmg)
-    
-    if min_dmg >= hp:
-        return "確定1発"
+def calculate_ttk_hits(min_dmg, max_dmg, hp):
+    """TTK を (最速発数, 確定発数) の数値で返す。倒せない場合は (0, 0)"""
+    if hp <= 0 or min_dmg <= 0: return 0, 0
+    return math.ceil(hp / max_dmg), math.ceil(hp / min_dmg)
+
+def format_ttk(min_hits, max_hits):
+    """(最速発数, 確定発数) を TTK の表示文字列にする"""
+    if max_hits <= 0:
+        return "N/A"
     elif max_hits == min_hits:
         return f"確定{max_hits}発"
     else:
         return f"乱数{min_hits}〜{max_hits}発"
 
-def perform_damage_calc(level, power, attack, defense, def_hp, final_correction_ratio):
-    """ダメージ計算を行い、ZAのダメージ幅とTTKを返す (SV結果は除外)"""
-    
-    # ZAの結果のみを取得
+def calculate_ttk(min_dmg, max_dmg, hp):
+    """TTK (Time To Knockout) を計算する"""
+    return format_ttk(*calculate_ttk_hits(min_dmg, max_dmg, hp))
+
+def compute_damage_range(level, power, attack, defense, final_correction_ratio):
+    """ZAのダメージ幅 (最小, 最大) を数値で返す"""
     za_result_max = calculate_damage_base(level, power, attack, defense, final_correction_ratio, is_za=True)
-    
     za_min_damage = math.floor(za_result_max * 0.85)
+    return za_min_damage, za_result_max
+
+def compute_damage_calc(level, power, attack, defense, def_hp, final_correction_ratio):
+    """ZAのダメージ幅とTTKを表示用の文字列で返す (記録はしない)"""
+    
+    # ZAの結果のみを取得
+    za_min_damage, za_result_max = compute_damage_range(level, power, attack, defense, final_correction_ratio)
     
     za_dmg_range = f"{za_min_damage}～{za_result_max}"
     
@@ -121,66 +158,624 @@ def perform_damage_calc(level, power, attack, defense, def_hp, final_correction_
     
     return za_dmg_range, za_ttk # ZAの結果のみを返す
 
+def compute_battle_sim_damage(level, power, attack, defense, def_hp, final_correction_ratio):
+    """対戦シミュレーションの1行分の結果 (最小ダメージ, 最大ダメージ, 最速発数, 確定発数) を数値で返す (記録はしない)"""
+    za_min_damage, za_result_max = compute_damage_range(level, power, attack, defense, final_correction_ratio)
+    return (za_min_damage, za_result_max, *calculate_ttk_hits(za_min_damage, za_result_max, def_hp))
+
+def perform_damage_calc(level, power, attack, defense, def_hp, final_correction_ratio):
+    """ダメージ計算を行い、ZAのダメージ幅とTTKを返す (SV結果は除外。計算ログが有効なら記録する)"""
+    args = (level, power, attack, defense, def_hp, final_correction_ratio)
+    result = compute_damage_calc(*args)
+    record_calculation('damage', args, result)
+    return result
+
+# --- 2.5 ベクトル化計算関数 (numpy) ---
+# 上の共通計算関数と同じ丸め順序で計算するため、結果は1件ずつ計算した場合と完全に一致する。
+def calculate_stat_value_np(base_stat, iv, ev, level, nature_modifier, battle_modifier):
+    """calculate_stat_value の配列版 (引数はブロードキャスト可能な配列/スカラー)"""
+    base_stat = np.asarray(base_stat, dtype=np.int64)
+    calc_base = (base_stat * 2 + iv + np.asarray(ev, dtype=np.int64) // 4) * level // 100 + 5
+    stat_after_nature = np.floor(calc_base * nature_modifier)
+    final_stat = np.floor(stat_after_nature * battle_modifier).astype(np.int64)
+    return np.where(base_stat == 0, 0, final_stat)
+
+def calculate_hp_value_np(base_hp, iv, ev, level):
+    """calculate_hp_value の配列版"""
+    base_hp = np.asarray(base_hp, dtype=np.int64)
+    calc_base = (base_hp * 2 + iv + np.asarray(ev, dtype=np.int64) // 4) * level // 100 + level + 10
+    return np.where(base_hp == 1, 1, calc_base)
+
+def calculate_damage_base_np(level, power, attack, defense, correction_ratio_no_rng_with_tech_plus, is_za=False):
+    """calculate_damage_base の配列版"""
+    base_calc_1 = np.asarray(level, dtype=np.int64) * 2 // 5 + 2
+    base_calc_2 = np.floor(base_calc_1 * power * np.asarray(attack, dtype=np.int64) / defense)
+    base_damage = np.floor(base_calc_2 / 50) + 2
+    final_damage_max = np.floor(base_damage * correction_ratio_no_rng_with_tech_plus)
+    if is_za:
+        final_damage_max = np.floor(final_damage_max * ZA_CORRECTION_RATIO)
+    return final_damage_max.astype(np.int64)
+
+def calculate_hits_np(damage, hp):
+    """hp を削り切るのに必要な発数 (ダメージ0以下は0 = 倒せない)"""
+    damage = np.asarray(damage, dtype=np.int64)
+    safe_damage = np.maximum(damage, 1)
+    return np.where(damage > 0, -(-np.asarray(hp, dtype=np.int64) // safe_damage), 0)
+
+# --- 2.6 技セットの一括評価 ---
+def prepare_moveset(moves, tech_plus_mod=1.0, other_mod=1.0, wall_mod=1.0, type_mods=None):
+    """
+    技セットを配列にまとめ、技ごとの最終補正倍率を前計算する。
+    type_mods は {技タイプ: 相性倍率} (未指定のタイプは等倍)。技プラス補正は対象の技にのみ掛かる。
+    """
+    type_mods = type_mods or {}
+    stab_mod = STAB_CHOICES["タイプ一致 (1.5倍)"]
+    return {
+        'names': [m['name'] for m in moves],
+        'power': np.array([m['power'] for m in moves], dtype=np.int64),
+        'is_physical': np.array([m['category'] == MOVE_CATEGORY_CHOICES[0] for m in moves], dtype=bool),
+        # 各モードと同じ順序 (STAB × 相性 × 道具 × 壁 × 技プラス) で掛ける
+        'ratio': np.array([
+            (stab_mod if m['stab'] else 1.0) * type_mods.get(m['type'], 1.0) * other_mod * wall_mod
+            * (tech_plus_mod if m['tech_plus'] else 1.0)
+            for m in moves
+        ], dtype=np.float64),
+    }
+
+def evaluate_moveset_np(level, att_stats, def_stats, moveset):
+    """
+    技セットの全技を1回の配列計算で評価する。
+    att_stats / def_stats は get_stats_from_settings の戻り値。詳細モードと同じく
+    最小ダメージは攻MIN vs 防MAX、最大ダメージは攻MAX vs 防MIN、確定数は HP MAX で求める。
+    """
+    is_physical = moveset['is_physical']
+    att_max = np.where(is_physical, att_stats['A_max'], att_stats['C_max'])
+    att_min = np.where(is_physical, att_stats['A_min'], att_stats['C_min'])
+    def_max = np.where(is_physical, def_stats['B_max'], def_stats['D_max'])
+    def_min = np.where(is_physical, def_stats['B_min'], def_stats['D_min'])
+
+    dmg_max = calculate_damage_base_np(level, moveset['power'], att_max, def_min, moveset['ratio'], is_za=True)
+    dmg_min_raw = calculate_damage_base_np(level, moveset['power'], att_min, def_max, moveset['ratio'], is_za=True)
+    dmg_min = np.floor(dmg_min_raw * 0.85).astype(np.int64)
+    return {
+        'dmg_min': dmg_min,
+        'dmg_max': dmg_max,
+        'hits_max': calculate_hits_np(dmg_min, def_stats['H_max']),
+        'hits_min': calculate_hits_np(dmg_max, def_stats['H_max']),
+    }
+
+def select_best_move(evaluation, criterion=None):
+    """評価結果から最適な技のインデックスを返す (技がなければ None)"""
+    dmg_min = evaluation['dmg_min']
+    if len(dmg_min) == 0:
+        return None
+    if criterion == BEST_MOVE_CRITERIA[1]:
+        # 確定数が少ない順 (倒せない技は最後)、同数なら最小ダメージが大きい順
+        hits = np.where(evaluation['hits_max'] > 0, evaluation['hits_max'], np.iinfo(np.int64).max)
+        return int(np.lexsort((-dmg_min, hits))[0])
+    return int(np.argmax(dmg_min))
+
+# --- 2.7 数値の結果テーブル (表示する行だけを文字列に整形) ---
+# 結果は短い内部列名の数値/カテゴリ列で保持し、並べ替えやメモリ量を抑える。
+# "12～15" や "乱数2〜3発" のような文字列は、画面に表示する行に対してのみ作る。
+RESULT_DISPLAY_PAGE_SIZE = 100
+
+
+def _compact_ints(values, signed=True):
+    """値が収まる最小の整数型 (int16/int32 または uint8/uint16/uint32) の配列にする"""
+    values = np.asarray(values, dtype=np.int64)
+    for dtype in ((np.int16, np.int32) if signed else (np.uint8, np.uint16, np.uint32)):
+        info = np.iinfo(dtype)
+        if values.size == 0 or (values.min() >= info.min and values.max() <= info.max):
+            return values.astype(dtype)
+    return values
+
+
+def build_damage_result_frame(dmg_min, dmg_max, hp, labels=None, values=None):
+    """
+    ダメージ幅と防御側HPの配列から、数値列だけの結果テーブルを作る。
+    labels はカテゴリ列 (名前・条件など)、values は追加の数値列 {列名: 配列}。
+    発数は calculate_ttk と同じ定義で、倒せない (最小ダメージ0以下) 場合は 0。
+    """
+    dmg_min = np.asarray(dmg_min, dtype=np.int64)
+    dmg_max = np.asarray(dmg_max, dtype=np.int64)
+    hp = np.asarray(hp, dtype=np.int64)
+    hits_max = calculate_hits_np(dmg_min, hp)
+    hits_min = np.where(hits_max > 0, calculate_hits_np(dmg_max, hp), 0)
+
+    frame = pd.DataFrame({name: pd.Categorical(column) for name, column in (labels or {}).items()})
+    for name, column in (values or {}).items():
+        frame[name] = _compact_ints(column)
+    frame['dmg_min'] = _compact_ints(dmg_min)
+    frame['dmg_max'] = _compact_ints(dmg_max)
+    frame['hp'] = _compact_ints(hp)
+    frame['hits_min'] = _compact_ints(hits_min, signed=False)
+    frame['hits_max'] = _compact_ints(hits_max, signed=False)
+    return frame
+
+
+def format_damage_result_rows(frame, column_labels):
+    """結果テーブルの (表示する) 行だけを、ダメージ幅と TTK の文字列付きの表示用テーブルにする"""
+    display = frame.drop(columns=['dmg_min', 'dmg_max', 'hits_min', 'hits_max'])
+    display['ZAダメ幅'] = [f"{lo}～{hi}" for lo, hi in zip(frame['dmg_min'], frame['dmg_max'])]
+    display['ZA TTK'] = [format_ttk(lo, hi) for lo, hi in zip(frame['hits_min'], frame['hits_max'])]
+    return display.rename(columns=column_labels)
+
+
+def display_damage_result_frame(frame, column_labels, key, page_size=RESULT_DISPLAY_PAGE_SIZE):
+    """結果テーブルを数値列のまま並べ替え、表示するページの行だけを整形して表示する"""
+    sortable = ['(並べ替えなし)'] + list(frame.columns)
+    col_sort, col_order, col_page = st.columns(3)
+    with col_sort:
+        sort_column = st.selectbox("並べ替え", sortable, format_func=lambda c: column_labels.get(c, c), key=f"{key}_sort")
+    with col_order:
+        ascending = st.radio("順序", ["昇順", "降順"], horizontal=True, key=f"{key}_order") == "昇順"
+    if sort_column != sortable[0]:
+        frame = frame.sort_values(sort_column, ascending=ascending, kind='stable')
+
+    n_pages = max(1, math.ceil(len(frame) / page_size))
+    with col_page:
+        page = st.number_input(f"ページ (全{n_pages}ページ / {len(frame):,}行)", min_value=1, max_value=n_pages, value=1, step=1, key=f"{key}_page")
+    start = (page - 1) * page_size
+    st.dataframe(format_damage_result_rows(frame.iloc[start:start + page_size], column_labels), use_container_width=True)
+
+# --- 2.8 並列実行の補助 ---
+def get_process_pool_function(func):
+    """
+    ProcessPoolExecutor に渡せる形の関数を返す。
+    Streamlit はこのスクリプトを __main__ として実行するため、子プロセスから参照できるよう
+    モジュールとして import した同名の関数に差し替える。
+    """
+    if __name__ != '__main__':
+        return func
+    module_name = os.path.splitext(os.path.basename(__file__))[0]
+    return getattr(importlib.import_module(module_name), func.__name__)
+
+
+# --- 2.9 計算ログ (追記専用の記録とリプレイ) ---
+# 環境変数 DAMAGE_CALC_LOG にファイルパスを指定すると、計算の入力と出力を 1行1件の JSON Lines で追記する
+CALC_LOG_ENV_VAR = "DAMAGE_CALC_LOG"
+
+
+def _calc_log_functions():
+    """ログの kind -> 再計算に使う (表示を伴わない) 計算関数"""
+    return {
+        'damage': compute_damage_calc,
+        'battle_sim': compute_battle_sim_damage,
+        'detailed': compute_detailed_result,
+    }
+
+
+def _calc_log_json_default(value):
+    """numpy のスカラーを JSON に書ける Python の値に変換する"""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"JSONに変換できない値です: {value!r}")
+
+
+def _normalize_calc_output(result):
+    """タプル/辞書/numpy値を JSON と同じ形に揃え、記録値と再計算値を比較できるようにする"""
+    return json.loads(json.dumps(result, default=_calc_log_json_default))
+
+
+def _calc_log_line(kind, ts, args, result):
+    return json.dumps(
+        {'kind': kind, 'ts': ts, 'in': list(args), 'out': result},
+        ensure_ascii=False, separators=(',', ':'), default=_calc_log_json_default,
+    ) + "\n"
+
+
+def record_calculation(kind, args, result):
+    """計算ログが有効なら 1件を追記する (1行を1回の write で書くので複数プロセスから追記しても行が混ざらない)"""
+    path = os.environ.get(CALC_LOG_ENV_VAR)
+    if not path:
+        return
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(_calc_log_line(kind, round(time.time(), 3), args, result))
+
+
+def record_calculations(kind, records):
+    """
+    計算ログが有効なら (入力, 出力) の組をまとめて1回の write で追記する (一括計算用)。
+    ログが無効なら records は読まないので、ジェネレーターを渡せば記録用の値も作られない。
+    """
+    path = os.environ.get(CALC_LOG_ENV_VAR)
+    if not path:
+        return
+    ts = round(time.time(), 3)
+    lines = "".join(_calc_log_line(kind, ts, args, result) for args, result in records)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(lines)
+
+
+def replay_calculation_log(lines, max_diffs=20):
+    """
+    計算ログを現在の計算エンジンで再実行し、記録と異なる結果と処理速度を返す。
+    戻り値: {'count', 'seconds', 'diffs': [(行番号, kind, 入力, 記録値, 再計算値)], 'n_diffs', 'errors': [(行番号, メッセージ)]}
+    """
+    functions = _calc_log_functions()
+    entries, errors = [], []
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+            entries.append((line_no, entry['kind'], functions[entry['kind']], entry['in'], entry['out']))
+        except (ValueError, KeyError, TypeError) as e:
+            errors.append((line_no, f"読み込めない行です: {e!r}"))
+
+    # 読み込みと比較を除いた再計算だけを計測する
+    outputs = [None] * len(entries)
+    start = time.perf_counter()
+    for i, (line_no, kind, func, args, _) in enumerate(entries):
+        try:
+            outputs[i] = func(*args)
+        except Exception as e:
+            outputs[i] = e
+    seconds = time.perf_counter() - start
+
+    diffs, n_diffs = [], 0
+    for (line_no, kind, _, args, expected), actual in zip(entries, outputs):
+        if isinstance(actual, Exception):
+            errors.append((line_no, f"{kind} の再計算に失敗しました: {actual!r}"))
+            continue
+        actual = _normalize_calc_output(actual)
+        if actual != expected:
+            n_diffs += 1
+            if len(diffs) < max_diffs:
+                diffs.append((line_no, kind, args, expected, actual))
+    return {'count': len(entries), 'seconds': seconds, 'diffs': diffs, 'n_diffs': n_diffs, 'errors': errors}
+
+
+
+# --- 2.10 計算結果の永続キャッシュ (SQLite) ---
+# 重い計算 (マトリクス・スイープ) の結果を、正規化した入力のハッシュ + 計算エンジンのバージョンをキーにディスクへ保存する。
+# サーバーを再起動しても結果を再利用でき、WAL モードの SQLite なので複数のサーバープロセスから同時に読み書きできる。
+RESULT_CACHE_ENV_VAR = "DAMAGE_CALC_CACHE"  # 保存先のパス ("off" で無効)
+RESULT_CACHE_MAX_MB_ENV_VAR = "DAMAGE_CALC_CACHE_MAX_MB"
+RESULT_CACHE_DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "damage_calc_results.sqlite3")
+RESULT_CACHE_DEFAULT_MAX_MB = 256
+# 計算式や結果の形式を変えたら上げる (古い結果は参照されなくなり、容量上限に達した時点で追い出される)
+CALC_ENGINE_VERSION = 1
+
+_result_cache_local = threading.local()
+
+
+def _result_cache_path():
+    path = os.environ.get(RESULT_CACHE_ENV_VAR, RESULT_CACHE_DEFAULT_PATH)
+    return None if path.strip().lower() in ("", "off") else path
+
+
+def _result_cache_max_bytes():
+    return int(float(os.environ.get(RESULT_CACHE_MAX_MB_ENV_VAR, RESULT_CACHE_DEFAULT_MAX_MB)) * 1024 * 1024)
+
+
+def _result_cache_engine():
+    """
+    キーに含める計算エンジンの識別子。ZA補正係数を変えた場合や、pickle した DataFrame・配列の
+    形式が変わりうる pandas / numpy の更新後も別の結果として扱う。
+    """
+    return f"{CALC_ENGINE_VERSION}:{ZA_CORRECTION_RATIO!r}:pandas-{pd.__version__}:numpy-{np.__version__}"
+
+
+def _result_cache_connection(path):
+    """スレッドごとに1本の接続を使う (sqlite3 の接続はスレッド間で共有できない)"""
+    connections = _result_cache_local.__dict__.setdefault('connections', {})
+    if path not in connections:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, func TEXT NOT NULL, value BLOB NOT NULL, "
+            "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+        connections[path] = conn
+    return connections[path]
+
+
+def _result_cache_json_default(value):
+    """json.dumps で直接書けない引数を安定した形にする (配列・DataFrame は内容のハッシュにする)"""
+    if isinstance(value, MappingProxyType):
+        return dict(value)
+    if isinstance(value, range):
+        return ['range', value.start, value.stop, value.step]
+    if isinstance(value, np.ndarray):
+        data = np.ascontiguousarray(value)
+        return ['ndarray', str(data.dtype), list(data.shape), hashlib.sha256(data.tobytes()).hexdigest()]
+    if isinstance(value, pd.DataFrame):
+        row_hashes = pd.util.hash_pandas_object(value, index=True).to_numpy()
+        return ['DataFrame', [str(c) for c in value.columns], [str(t) for t in value.dtypes],
+                hashlib.sha256(row_hashes.tobytes()).hexdigest()]
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"キャッシュのキーにできない引数です: {type(value).__name__}")
+
+
+_function_signature = functools.lru_cache(maxsize=None)(inspect.signature)
+
+
+def result_cache_key(func, args, kwargs):
+    """関数名・引数 (既定値を含めて正規化)・計算エンジンのバージョンから安定したキーを作る"""
+    bound = _function_signature(func).bind(*args, **kwargs)
+    bound.apply_defaults()
+    payload = json.dumps(
+        [_result_cache_engine(), func.__qualname__, bound.arguments],
+        sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=_result_cache_json_default,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _result_cache_get(path, key):
+    conn = _result_cache_connection(path)
+    row = conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return None
+    try:
+        conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+    except sqlite3.OperationalError:
+        pass  # 他のプロセスが書き込み中なら、アクセス時刻の更新は諦める (LRU の精度が少し落ちるだけ)
+    return row[0]
+
+
+def _result_cache_delete(path, key):
+    _result_cache_connection(path).execute("DELETE FROM results WHERE key = ?", (key,))
+
+
+def _result_cache_put(path, key, func_name, blob):
+    """結果を保存し、容量上限を超えたら最終アクセスが古いものから削除する"""
+    max_bytes = _result_cache_max_bytes()
+    if len(blob) > max_bytes:
+        return
+    conn = _result_cache_connection(path)
+    # BEGIN IMMEDIATE で書き込みロックを取り、他のプロセスと追加・削除が混ざらないようにする
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("INSERT OR REPLACE INTO results (key, func, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                     (key, func_name, sqlite3.Binary(blob), len(blob), time.time()))
+        excess = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0] - max_bytes
+        if excess > 0:
+            evict = []
+            for old_key, size in conn.execute("SELECT key, size FROM results ORDER BY last_access"):
+                if excess <= 0:
+                    break
+                evict.append((old_key,))
+                excess -= size
+            conn.executemany("DELETE FROM results WHERE key = ?", evict)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def persistent_cache(func):
+    """
+    結果をディスクにキャッシュするデコレーター。ヒットした場合も結果は毎回 pickle から復元するので、
+    呼び出し側で変更しても他のセッションには影響しない (st.cache_data と同じ扱い)。
+    キャッシュの読み書きに失敗した場合は、普通に計算して返す。復元できない結果 (壊れた行や、
+    互換性のない形式で保存された行) は削除し、計算し直した結果で置き換える。
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        path = _result_cache_path()
+        if path is None:
+            return func(*args, **kwargs)
+        try:
+            key = result_cache_key(func, args, kwargs)
+            blob = _result_cache_get(path, key)
+        except (sqlite3.Error, OSError, TypeError, ValueError):
+            key = blob = None
+        if blob is not None:
+            try:
+                return pickle.loads(blob)
+            except Exception:
+                # pickle.loads は壊れたデータに対して UnpicklingError 以外 (EOFError, AttributeError,
+                # ImportError など) も投げるので、すべて読み込み失敗として扱う
+                try:
+                    _result_cache_delete(path, key)
+                except sqlite3.Error:
+                    pass
+        result = func(*args, **kwargs)
+        if key is not None:
+            try:
+                _result_cache_put(path, key, func.__qualname__, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+            except (sqlite3.Error, OSError, pickle.PicklingError):
+                pass
+        return result
+    return wrapper
+
+
+def result_cache_stats():
+    """(件数, 合計バイト数)。キャッシュが無効なら None"""
+    path = _result_cache_path()
+    if path is None:
+        return None
+    return _result_cache_connection(path).execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+
+
+def clear_result_cache():
+    path = _result_cache_path()
+    if path is not None:
+        _result_cache_connection(path).execute("DELETE FROM results")
+
+
 # --- 3. セッションステート初期化と管理関数 ---
 
+# 全セッションで共有する読み取り専用データ。
+# st.cache_resource はプロセス内で1つのオブジェクトを返すため、セッション数が増えてもコピーされない。
+@st.cache_resource
+def get_default_pokemons():
+    """初期登録ポケモン (HABCDS種族値・個体値・技セット) を変更不可の形で返す"""
+    def freeze(p):
+        return MappingProxyType({**p, 'moves': tuple(MappingProxyType(m) for m in p['moves'])})
+
+    return tuple(freeze(p) for p in [
+        {'id': 'default-1', 'name': 'アタッカーA', 'level': 50, 
+         'H_base': 100, 'A_base': 130, 'B_base': 80, 'C_base': 80, 'D_base': 80, 'S_base': 100,
+         'H_iv': 'さいこう/きたえた! (31)', 'A_iv': 'さいこう/きたえた! (31)', 'B_iv': 'さいこう/きたえた! (31)', 
+         'C_iv': 'さいこう/きたえた! (31)', 'D_iv': 'さいこう/きたえた! (31)', 'S_iv': 'さいこう/きたえた! (31)',
+         'att_stat_name': '攻撃', 'def_stat_name': '防御',
+         'moves': [
+             {'name': 'じしん', 'power': 100, 'category': '物理', 'type': 'じめん', 'stab': True, 'tech_plus': True},
+             {'name': 'ストーンエッジ', 'power': 100, 'category': '物理', 'type': 'いわ', 'stab': False, 'tech_plus': False},
+             {'name': 'かみくだく', 'power': 80, 'category': '物理', 'type': 'あく', 'stab': False, 'tech_plus': False},
+         ]},
+        {'id': 'default-2', 'name': '受けポケモンB', 'level': 50, 
+         'H_base': 95, 'A_base': 100, 'B_base': 100, 'C_base': 100, 'D_base': 120, 'S_base': 60,
+         'H_iv': 'さいこう/きたえた! (31)', 'A_iv': 'さいこう/きたえた! (31)', 'B_iv': 'さいこう/きたえた! (31)', 
+         'C_iv': 'さいこう/きたえた! (31)', 'D_iv': 'さいこう/きたえた! (31)', 'S_iv': 'さいこう/きたえた! (31)',
+         'att_stat_name': '特攻', 'def_stat_name': '特防',
+         'moves': [
+             {'name': 'ムーンフォース', 'power': 95, 'category': '特殊', 'type': 'フェアリー', 'stab': True, 'tech_plus': True},
+             {'name': 'シャドーボール', 'power': 80, 'category': '特殊', 'type': 'ゴースト', 'stab': False, 'tech_plus': False},
+         ]}
+    ])
+
+
+def build_virtual_p_choices(pokemon_names):
+    """名前の並びから仮想敵選択肢を作る"""
+    return ("直接実数値入力",) + tuple("マイポケモン: " + name for name in pokemon_names)
+
+
+@st.cache_resource
+def get_default_virtual_p_choices():
+    """初期登録ポケモンの仮想敵選択肢 (全セッション共有・読み取り専用)"""
+    return build_virtual_p_choices(p['name'] for p in get_default_pokemons())
+
+
 def initialize_session_state():
     if 'my_pokemons' not in st.session_state:
-        # 初期データとして例をいくつか追加 (HABCDS種族値と個体値のみ)
-        st.session_state['my_pokemons'] = [
-            {'id': str(uuid.uuid4()), 'name': 'アタッカーA', 'level': 50, 
-             'H_base': 100, 'A_base': 130, 'B_base': 80, 'C_base': 80, 'D_base': 80, 'S_base': 100,
-             'H_iv': 'さいこう/きたえた! (31)', 'A_iv': 'さいこう/きたえた! (31)', 'B_iv': 'さいこう/きたえた! (31)', 
-             'C_iv': 'さいこう/きたえた! (31)', 'D_iv': 'さいこう/きたえた! (31)', 'S_iv': 'さいこう/きたえた! (31)',
-             'att_stat_name': '攻撃', 'def_stat_name': '防御'},
-            {'id': str(uuid.uuid4()), 'name': '受けポケモンB', 'level': 50, 
-             'H_base': 95, 'A_base': 100, 'B_base': 100, 'C_base': 100, 'D_base': 120, 'S_base': 60,
-             'H_iv': 'さいこう/きたえた! (31)', 'A_iv': 'さいこう/きたえた! (31)', 'B_iv': 'さいこう/きたえた! (31)', 
-             'C_iv': 'さいこう/きたえた! (31)', 'D_iv': 'さいこう/きたえた! (31)', 'S_iv': 'さいこう/きたえた! (31)',
-             'att_stat_name': '特攻', 'def_stat_name': '特防'}
-        ]
-    
-    # 仮想敵選択肢を最新に更新
-    st.session_state['VIRTUAL_P_CHOICES'] = ["直接実数値入力"] + ["マイポケモン: " + p['name'] for p in st.session_state.get('my_pokemons', [])]
+        # 初期データは共有オブジェクトを参照し、セッションにはリスト (差分) だけを持つ
+        st.session_state['my_pokemons'] = list(get_default_pokemons())
+        st.session_state['VIRTUAL_P_CHOICES'] = get_default_virtual_p_choices()
+    elif 'VIRTUAL_P_CHOICES' not in st.session_state:
+        refresh_virtual_p_choices()
+    # 以降はマイポケモンを変更した箇所で refresh_virtual_p_choices() を呼んで更新する (再実行のたびには作り直さない)
+
+
+def refresh_virtual_p_choices():
+    """仮想敵選択肢をマイポケモンリストに合わせて更新する (セッションごとのデータなので session_state に持つ)"""
+    st.session_state['VIRTUAL_P_CHOICES'] = build_virtual_p_choices(
+        p['name'] for p in st.session_state.get('my_pokemons', [])
+    )
+
+
+# サイドバーのリストは1ページ分だけ描画し、登録数が増えてもウィジェット数を一定に保つ
+ROSTER_PAGE_SIZE = 20
+
+
+def _roster_search_key(text):
+    """NFKC で全角英数字・半角カナを揃えてから casefold する"""
+    return unicodedata.normalize('NFKC', text).casefold()
+
+
+def filter_roster_indices(pokemons, query):
+    """名前に query を含む (大文字/小文字・全角/半角の英数字とカナを区別しない) ポケモンのインデックスを返す"""
+    query = _roster_search_key(query.strip())
+    if not query:
+        return list(range(len(pokemons)))
+    return [i for i, p in enumerate(pokemons) if query in _roster_search_key(p['name'])]
+
+
+def format_roster_rows(pokemons, indices):
+    """サイドバーの一覧表 (1ページ分) を作る"""
+    return pd.DataFrame({
+        'No.': [i + 1 for i in indices],
+        '名前': [pokemons[i]['name'] for i in indices],
+        'Lv': [pokemons[i].get('level', 50) for i in indices],
+        '種族値 (HABCDS)': ["-".join(str(pokemons[i][f'{s}_base']) for s in STAT_KEYS) for i in indices],
+        '個体値 (HABCDS)': ["/".join(iv_text_from_choice(pokemons[i][f'{s}_iv']) for s in STAT_KEYS) for i in indices],
+        '技': [", ".join(m['name'] for m in pokemons[i].get('moves', ())) for i in indices],
+    })
+
+
+def _clear_roster_selection():
+    """ページや検索語が変わったら削除の選択を解除する (表示外のポケモンを消さないため)"""
+    st.session_state['roster_delete_select'] = []
 
 
 # ポケモン削除用コールバック関数
-def delete_pokemon_callback(index_to_delete):
-    """マイポケモンリストから指定インデックスのポケモンを削除するコールバック"""
-    if 'my_pokemons' in st.session_state and 0 <= index_to_delete < len(st.session_state.my_pokemons):
-        st.session_state.my_pokemons.pop(index_to_delete)
+def delete_pokemons_callback():
+    """サイドバーで選択したポケモンをマイポケモンリストからまとめて削除するコールバック"""
+    ids_to_delete = set(st.session_state.get('roster_delete_select', []))
+    if ids_to_delete and 'my_pokemons' in st.session_state:
+        st.session_state.my_pokemons = [p for p in st.session_state.my_pokemons if p['id'] not in ids_to_delete]
         # 仮想敵選択肢も更新
-        st.session_state['VIRTUAL_P_CHOICES'] = ["直接実数値入力"] + ["マイポケモン: " + p['name'] for p in st.session_state.get('my_pokemons', [])]
+        refresh_virtual_p_choices()
+    _clear_roster_selection()
 
 
 def display_pokemon_list():
-    """登録済みポケモンリストをサイドバーに表示する (表示は種族値/個体値のみ)"""
+    """登録済みポケモンリストをサイドバーに表示する (名前検索 + ページ送り + まとめて削除)"""
     st.sidebar.markdown("### 登録済みポケモンリスト (マイポケモン)")
-    if not st.session_state.my_pokemons:
+    pokemons = st.session_state.my_pokemons
+    if not pokemons:
         st.sidebar.caption("ポケモンが登録されていません。")
         return
-        
-    for i, p in enumerate(st.session_state.my_pokemons):
-        # 修正: buttonのon_clickを使ってコールバックを指定
-        st.sidebar.button(
-            "削除", 
-            key=f"delete_btn_{p['id']}",
-            on_click=delete_pokemon_callback,
-            args=(i,) # コールバックに渡す引数
+
+    query = st.sidebar.text_input("名前で検索", key="roster_search", on_change=_clear_roster_selection)
+    indices = filter_roster_indices(pokemons, query)
+    if not indices:
+        st.sidebar.caption(f"「{query}」に一致するポケモンはいません。(登録数: {len(pokemons)})")
+        return
+
+    n_pages = max(1, math.ceil(len(indices) / ROSTER_PAGE_SIZE))
+    # 検索や削除で件数が減ってページが範囲外になった場合は最終ページを表示する
+    if st.session_state.setdefault('roster_page', 1) > n_pages:
+        st.session_state['roster_page'] = n_pages
+    if n_pages > 1:
+        page = st.sidebar.number_input(
+            f"ページ (全{n_pages}ページ / {len(indices)}件)", min_value=1, max_value=n_pages, step=1,
+            key="roster_page", on_change=_clear_roster_selection,
         )
-            
-        with st.sidebar.expander(f"No.{i+1} : **{p['name']}**"):
-            level = p.get('level', 50)
-            st.caption(f"Lv: {level}")
-            
-            st.caption("--- 種族値/個体値 ---")
-            stats = ['H', 'A', 'B', 'C', 'D', 'S']
-            stat_info = [f"{s} B:{p[f'{s}_base']} I:{p[f'{s}_iv'][:5]}" for s in stats]
-            st.caption(", ".join(stat_info))
+    else:
+        page = 1
+    page_indices = indices[(page - 1) * ROSTER_PAGE_SIZE:page * ROSTER_PAGE_SIZE]
+
+    st.sidebar.dataframe(format_roster_rows(pokemons, page_indices), hide_index=True, use_container_width=True)
+
+    labels = {pokemons[i]['id']: f"No.{i+1} : {pokemons[i]['name']}" for i in page_indices}
+    # 以前のページの選択が残っていれば、表示中の選択肢に含まれるものだけにする
+    selected = st.session_state.get('roster_delete_select', [])
+    if any(pid not in labels for pid in selected):
+        st.session_state['roster_delete_select'] = [pid for pid in selected if pid in labels]
+    st.sidebar.multiselect(
+        "削除するポケモン", options=list(labels), format_func=labels.__getitem__, key="roster_delete_select",
+    )
+    st.sidebar.button(
+        "選択したポケモンを削除",
+        key="roster_delete_btn",
+        on_click=delete_pokemons_callback,
+        disabled=not st.session_state.get('roster_delete_select'),
+    )
+
+def _clear_result_cache_callback():
+    try:
+        clear_result_cache()
+    except (sqlite3.Error, OSError) as e:
+        st.sidebar.warning(f"計算結果キャッシュを削除できませんでした ({e})")
+
+
+def display_result_cache_status():
+    """サイドバーに計算結果キャッシュの使用量と削除ボタンを表示する"""
+    try:
+        stats = result_cache_stats()
+    except (sqlite3.Error, OSError) as e:
+        # 保存先が書き込めないなどの場合も、計算自体はキャッシュなしで続けられる
+        st.sidebar.warning(f"計算結果キャッシュ: 利用できません ({e})")
+        return
+    if stats is None:
+        return
+    count, size = stats
+    st.sidebar.caption(f"計算結果キャッシュ: {count:,} 件 / {size / 1024 / 1024:.1f} MB (上限 {_result_cache_max_bytes() / 1024 / 1024:.0f} MB)")
+    st.sidebar.button("計算結果キャッシュを削除", key="clear_result_cache_btn", on_click=_clear_result_cache_callback, disabled=count == 0)
 
 # --- 4. ポケモン登録フォーム関数 ---
 def register_pokemon_form():
     st.markdown("---")
-    st.subheader("📝 新規ポケモン登録 (種族値・個体値のみ)")
+    st.subheader("📝 新規ポケモン登録 (種族値・個体値・技セット)")
     
     with st.form("register_pokemon"):
         p_name = st.text_input("ポケモンの名前 (ニックネーム)", key="reg_name", value="新規ポケモン")
@@ -199,6 +794,20 @@ def register_pokemon_form():
             with col_iv: 
                 iv_inputs[f'{s}_iv'] = st.selectbox(f"{s} 個体値", options=IV_CHOICES, key=f"reg_{s}_iv")
 
+        st.markdown("##### 技セット (技名が空欄の枠は登録しません)")
+        move_inputs = []
+        for j in range(1, MAX_MOVES + 1):
+            col_m_name, col_m_power, col_m_cat, col_m_type, col_m_stab, col_m_tech = st.columns([3, 2, 2, 2, 1, 1])
+            with col_m_name: m_name = st.text_input(f"技{j} 技名", key=f"reg_move_{j}_name")
+            with col_m_power: m_power = st.number_input(f"技{j} 威力", min_value=1, value=80, step=1, key=f"reg_move_{j}_power")
+            with col_m_cat: m_category = st.selectbox(f"技{j} 分類", options=MOVE_CATEGORY_CHOICES, key=f"reg_move_{j}_cat")
+            with col_m_type: m_type = st.text_input(f"技{j} タイプ", key=f"reg_move_{j}_type")
+            with col_m_stab: m_stab = st.checkbox("一致", key=f"reg_move_{j}_stab")
+            with col_m_tech: m_tech = st.checkbox("技プラス", key=f"reg_move_{j}_tech")
+            if m_name.strip():
+                move_inputs.append({'name': m_name.strip(), 'power': m_power, 'category': m_category,
+                                    'type': m_type.strip(), 'stab': m_stab, 'tech_plus': m_tech})
+
         submitted = st.form_submit_button("このポケモンを登録")
         
         if submitted:
@@ -208,24 +817,299 @@ def register_pokemon_form():
                 'level': p_level,
                 **stat_inputs,
                 **iv_inputs,
-                'att_stat_name': '攻撃', 'def_stat_name': '防御'
+                'att_stat_name': '攻撃', 'def_stat_name': '防御',
+                'moves': move_inputs,
             }
             st.session_state.my_pokemons.append(new_pokemon)
             
             # VIRTUAL_P_CHOICESを更新
-            st.session_state['VIRTUAL_P_CHOICES'] = ["直接実数値入力"] + ["マイポケモン: " + p['name'] for p in st.session_state.get('my_pokemons', [])]
+            refresh_virtual_p_choices()
             st.success(f"{p_name} を登録しました！")
             
             # Streamlitの再実行は不要なためコメントアウトまたは削除
             # st.experimental_rerun() 
 
+# --- 4.5 チーム一括インポート/エクスポート ---
+STAT_KEYS = ['H', 'A', 'B', 'C', 'D', 'S']
+STAT_NAME_PAIRS = {'攻撃': '防御', '特攻': '特防'}
+TEAM_FORMAT_CHOICES = ["Showdown形式 (テキスト)", "JSON Lines"]
+
+
+def iv_choice_from_text(text):
+    """"31" や "26-29" の表記から個体値の選択肢を返す (該当なしは ValueError)"""
+    text = text.strip()
+    if '-' in text:
+        low, high = (int(v) for v in text.split('-', 1))
+        for choice, iv_range in IV_RANGES.items():
+            if iv_range == (low, high):
+                return choice
+        raise ValueError(f"個体値の範囲 {text} は選択肢にありません")
+    iv = int(text)
+    if not 0 <= iv < len(IV_CHOICE_BY_VALUE):
+        raise ValueError(f"個体値 {iv} は範囲外です (0～31)")
+    return IV_CHOICE_BY_VALUE[iv]
+
+
+def iv_text_from_choice(choice):
+    """個体値の選択肢を "31" / "26-29" 形式の文字列にする"""
+    iv_min, iv_max = get_iv_range(choice)
+    return str(iv_min) if iv_min == iv_max else f"{iv_min}-{iv_max}"
+
+
+def normalize_move(data):
+    """技1つ分の辞書を検証し、技セット形式に揃えて返す"""
+    if not isinstance(data, dict):
+        raise ValueError(f"技はオブジェクト ({{\"name\": ..., \"power\": ...}}) で記述してください: {data!r}")
+    name = str(data.get('name', '')).strip()
+    if not name:
+        raise ValueError("技名がありません")
+    power = int(data.get('power', 0))
+    if power < 1:
+        raise ValueError(f"技 {name} の威力 {power} は1以上である必要があります")
+    category = data.get('category', MOVE_CATEGORY_CHOICES[0])
+    if category not in MOVE_CATEGORY_CHOICES:
+        raise ValueError(f"技 {name} の分類 {category} は 物理/特殊 のいずれかである必要があります")
+    return {'name': name, 'power': power, 'category': category, 'type': str(data.get('type', '')).strip(),
+            'stab': bool(data.get('stab', False)), 'tech_plus': bool(data.get('tech_plus', False))}
+
+
+def normalize_team_set(data):
+    """インポートした1体分の辞書を検証し、マイポケモン形式に揃えて返す"""
+    name = str(data.get('name', '')).strip()
+    if not name:
+        raise ValueError("名前がありません")
+    level = int(data.get('level', 50))
+    if not 1 <= level <= 100:
+        raise ValueError(f"レベル {level} は範囲外です (1～100)")
+
+    pokemon = {'id': str(uuid.uuid4()), 'name': name, 'level': level}
+    for s in STAT_KEYS:
+        if f'{s}_base' not in data:
+            raise ValueError(f"{s} 種族値がありません")
+        base = int(data[f'{s}_base'])
+        if base < 1:
+            raise ValueError(f"{s} 種族値 {base} は1以上である必要があります")
+        pokemon[f'{s}_base'] = base
+
+        iv_choice = data.get(f'{s}_iv', IV_CHOICES[0])
+        if iv_choice not in IV_RANGES:
+            iv_choice = iv_choice_from_text(str(iv_choice))
+        pokemon[f'{s}_iv'] = iv_choice
+
+    att_stat_name = data.get('att_stat_name', '攻撃')
+    if att_stat_name not in STAT_NAME_PAIRS:
+        raise ValueError(f"参照能力 {att_stat_name} は 攻撃/特攻 のいずれかである必要があります")
+    pokemon['att_stat_name'] = att_stat_name
+    pokemon['def_stat_name'] = STAT_NAME_PAIRS[att_stat_name]
+
+    moves = data.get('moves') or []
+    if not isinstance(moves, list):
+        raise ValueError("moves は技のリストで記述してください")
+    if len(moves) > MAX_MOVES:
+        raise ValueError(f"技は{MAX_MOVES}つまでです ({len(moves)}つ)")
+    pokemon['moves'] = [normalize_move(m) for m in moves]
+    return pokemon
+
+
+def _parse_stat_spread(text, parse_value):
+    """"100 H / 130 A / ..." 形式を {能力: 値} に分解する"""
+    spread = {}
+    for part in text.split('/'):
+        part = part.strip()
+        if not part:
+            continue
+        value_text, _, stat = part.rpartition(' ')
+        stat = stat.strip().upper()
+        if stat not in STAT_KEYS or not value_text:
+            raise ValueError(f"能力値の表記 '{part}' を解釈できません")
+        spread[stat] = parse_value(value_text)
+    return spread
+
+
+def _parse_move_line(text):
+    """"じしん | 100 | 物理 | じめん | 一致 | 技プラス" 形式の技1行を辞書にする"""
+    fields = [f.strip() for f in text.split('|')]
+    if len(fields) < 3:
+        raise ValueError(f"技の表記 '{text}' を解釈できません (技名 | 威力 | 分類 が必要です)")
+    fields += [''] * (6 - len(fields))
+    return {'name': fields[0], 'power': int(fields[1]), 'category': fields[2], 'type': fields[3],
+            'stab': fields[4] == "一致", 'tech_plus': fields[5] == "技プラス"}
+
+
+def format_team_set_paste(p):
+    """マイポケモン1体を Showdown 風のテキストブロックにする"""
+    base = " / ".join(f"{p[f'{s}_base']} {s}" for s in STAT_KEYS)
+    ivs = " / ".join(f"{iv_text_from_choice(p[f'{s}_iv'])} {s}" for s in STAT_KEYS)
+    moves = [
+        f"- {m['name']} | {m['power']} | {m['category']} | {m['type']} | "
+        f"{'一致' if m['stab'] else '不一致'} | {'技プラス' if m['tech_plus'] else '-'}"
+        for m in p.get('moves', ())
+    ]
+    return "\n".join([
+        p['name'],
+        f"Level: {p.get('level', 50)}",
+        f"Base: {base}",
+        f"IVs: {ivs}",
+        f"Stats: {p.get('att_stat_name', '攻撃')} / {p.get('def_stat_name', '防御')}",
+        *moves,
+    ])
+
+
+def export_team_paste(pokemons):
+    return "\n\n".join(format_team_set_paste(p) for p in pokemons) + "\n"
+
+
+def export_team_jsonl(pokemons):
+    keys = ['name', 'level'] + [f'{s}_base' for s in STAT_KEYS] + [f'{s}_iv' for s in STAT_KEYS] + ['att_stat_name', 'def_stat_name']
+    return "".join(
+        json.dumps({**{k: p[k] for k in keys if k in p}, 'moves': [dict(m) for m in p.get('moves', ())]}, ensure_ascii=False) + "\n"
+        for p in pokemons
+    )
+
+
+def iter_team_sets_paste(lines):
+    """
+    Showdown 風テキストを1行ずつ読み、(行番号, ポケモン or None, エラー or None) を順に返す。
+    空行でブロックを区切り、エラーのあったブロックはスキップする。"- " で始まる行は技として読む。
+    """
+    data, start_no, error, error_no = None, 0, None, 0
+
+    def finish():
+        if error is not None:
+            return error_no, None, error
+        try:
+            return start_no, normalize_team_set(data), None
+        except (ValueError, TypeError) as e:
+            return start_no, None, str(e)
+
+    for line_no, raw in enumerate(lines, start=1):
+        line = raw.strip()
+        if not line:
+            if data is not None:
+                yield finish()
+                data = None
+            continue
+        if data is None:
+            # ブロック先頭行は名前
+            data, start_no, error = {'name': line}, line_no, None
+            continue
+        if error is not None:
+            continue
+        if line.startswith('-'):
+            # "- " で始まる行は技
+            try:
+                data.setdefault('moves', []).append(_parse_move_line(line[1:]))
+            except ValueError as e:
+                error, error_no = str(e), line_no
+            continue
+
+        key, sep, value = line.partition(':')
+        key = key.strip().lower()
+        try:
+            if not sep:
+                raise ValueError(f"'{line}' を解釈できません")
+            if key == 'level':
+                data['level'] = int(value)
+            elif key == 'base':
+                for s, v in _parse_stat_spread(value, int).items():
+                    data[f'{s}_base'] = v
+            elif key == 'ivs':
+                for s, v in _parse_stat_spread(value, iv_choice_from_text).items():
+                    data[f'{s}_iv'] = v
+            elif key == 'stats':
+                data['att_stat_name'] = value.split('/')[0].strip()
+            else:
+                raise ValueError(f"未知の項目 '{key}' です")
+        except ValueError as e:
+            error, error_no = str(e), line_no
+
+    if data is not None:
+        yield finish()
+
+
+def iter_team_sets_jsonl(lines):
+    """JSON Lines を1行ずつ読み、(行番号, ポケモン or None, エラー or None) を順に返す"""
+    for line_no, raw in enumerate(lines, start=1):
+        line = raw.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+            if not isinstance(data, dict):
+                raise ValueError("1行に1体分のオブジェクトを記述してください")
+            yield line_no, normalize_team_set(data), None
+        except (ValueError, TypeError, OverflowError) as e:  # OverflowError: int() に 1e400 (inf) が渡された場合
+            yield line_no, None, str(e)
+
+
+def decode_uploaded_text(data):
+    """
+    アップロードされたファイルの中身 (bytes) を UTF-8 (BOM 付きも可) として読み、(テキスト, エラー or None) を返す。
+    読めない場合のエラーは (行番号, メッセージ) で、テキストは None。
+    """
+    try:
+        return data.decode("utf-8-sig"), None
+    except UnicodeDecodeError as e:
+        line_no = data[:e.start].count(b"\n") + 1
+        return None, (line_no, "UTF-8 として読み込めません。Shift_JIS (CP932) などで保存されたファイルは UTF-8 で保存し直してください。")
+
+
+def import_team_sets(lines, fmt):
+    """テキストの各行からポケモンを一括で読み込み、(ポケモンのリスト, [(行番号, エラー)]) を返す"""
+    parser = iter_team_sets_jsonl if fmt == "JSON Lines" else iter_team_sets_paste
+    pokemons, errors = [], []
+    for line_no, pokemon, error in parser(lines):
+        if error is None:
+            pokemons.append(pokemon)
+        else:
+            errors.append((line_no, error))
+    return pokemons, errors
+
+
+def team_import_export_form():
+    st.markdown("---")
+    st.subheader("📦 チーム一括インポート/エクスポート")
+
+    fmt = st.radio("形式", TEAM_FORMAT_CHOICES, horizontal=True, key="team_io_format")
+
+    with st.form("team_import"):
+        uploaded = st.file_uploader("ファイルから読み込む", type=["txt", "jsonl", "json"], key="team_import_file")
+        pasted = st.text_area("または貼り付け", height=200, key="team_import_text")
+        submitted = st.form_submit_button("一括インポート")
+
+        if submitted:
+            if uploaded is not None:
+                text, decode_error = decode_uploaded_text(uploaded.getvalue())
+            else:
+                text, decode_error = pasted, None
+            if decode_error is None:
+                pokemons, errors = import_team_sets(io.StringIO(text), fmt)
+            else:
+                pokemons, errors = [], [decode_error]
+
+            # 1回の操作でまとめて追加し、選択肢の更新も1度だけ行う
+            st.session_state.my_pokemons.extend(pokemons)
+            refresh_virtual_p_choices()
+
+            st.success(f"{len(pokemons)} 体をインポートしました。")
+            if errors:
+                st.warning(f"{len(errors)} 件のエラーがあります (該当セットはスキップ)。")
+                st.dataframe(pd.DataFrame(errors, columns=['行', 'エラー']), use_container_width=True)
+
+    if st.session_state.my_pokemons:
+        if fmt == "JSON Lines":
+            data, file_name = export_team_jsonl(st.session_state.my_pokemons), "my_pokemons.jsonl"
+        else:
+            data, file_name = export_team_paste(st.session_state.my_pokemons), "my_pokemons.txt"
+        st.download_button("マイポケモンをエクスポート", data=data.encode("utf-8"), file_name=file_name, key="team_export_btn")
+
 # --- 5. ダメージ計算結果表示関数 (詳細モード専用) ---
-def calculate_and_print_st_detailed(level, power, 
-                                    a_base, a_ev, a_nature, a_battle_mod, a_iv_choice,
-                                    d_base, d_ev, d_nature, d_battle_mod, d_iv_choice,
-                                    d_hp_base, d_hp_ev, d_hp_iv_choice,
-                                    final_correction_ratio):
-    """詳細モードの結果を計算し、Streamlitに出力する"""
+def compute_detailed_result(level, power, 
+                            a_base, a_ev, a_nature, a_battle_mod, a_iv_choice,
+                            d_base, d_ev, d_nature, d_battle_mod, d_iv_choice,
+                            d_hp_base, d_hp_ev, d_hp_iv_choice,
+                            final_correction_ratio):
+    """詳細モードの実数値ブレ幅・ダメージ幅・HP・TTKを計算して辞書で返す (表示はしない)"""
     
     # 1. IVのブレ幅を取得
     a_iv_min, a_iv_max = get_iv_range(a_iv_choice)
@@ -237,14 +1121,10 @@ def calculate_and_print_st_detailed(level, power,
     # 攻撃側 実数値ブレ幅
     att_min_value = calculate_stat_value(a_base, a_iv_min, a_ev, level, a_nature, a_battle_mod)
     att_max_value = calculate_stat_value(a_base, a_iv_max, a_ev, level, a_nature, a_battle_mod)
-    att_value_range_str = f"{att_min_value}～{att_max_value}"
-    if att_min_value == att_max_value: att_value_range_str = str(att_min_value)
     
     # 防御側 実数値ブレ幅
     def_min_value = calculate_stat_value(d_base, d_iv_min, d_ev, level, d_nature, d_battle_mod)
     def_max_value = calculate_stat_value(d_base, d_iv_max, d_ev, level, d_nature, d_battle_mod)
-    def_value_range_str = f"{def_min_value}～{def_max_value}"
-    if def_min_value == def_max_value: def_value_range_str = str(def_min_value)
 
 
     # 3. ダメージ最大値の計算に必要な実数値 (攻MAX vs 防MIN)
@@ -266,17 +1146,46 @@ def calculate_and_print_st_detailed(level, power,
     za_min_damage = math.floor(za_result_min_raw * 0.85)
 
     # 5. TTK計算用のHP実数値 (HPは最大値を使用し、最も耐久がある状態を想定)
-    # HPのブレ幅表示も対応
     def_hp_value_max = calculate_hp_value(d_hp_base, d_hp_iv_max, d_hp_ev, level)
     def_hp_value_min = calculate_hp_value(d_hp_base, d_hp_iv_min, d_hp_ev, level)
-    def_hp_range_str = f"{def_hp_value_min}～{def_hp_value_max}"
-    if def_hp_value_min == def_hp_value_max: def_hp_range_str = str(def_hp_value_max)
-    
-    # 6. 結果の整形
-    za_dmg_range = f"{za_min_damage}～{za_result_max}"
-    
-    # TTKは、攻最小 vs 防最大 で計算された最小ダメージ、および攻最大 vs 防最小 で計算された最大ダメージを使用し、HP MAXに対して計算
+
+    # 6. TTKは、攻最小 vs 防最大 で計算された最小ダメージ、および攻最大 vs 防最小 で計算された最大ダメージを使用し、HP MAXに対して計算
     za_ttk = calculate_ttk(za_min_damage, za_result_max, def_hp_value_max)
+
+    return {
+        'att_min': att_min_value, 'att_max': att_max_value,
+        'def_min': def_min_value, 'def_max': def_max_value,
+        'hp_min': def_hp_value_min, 'hp_max': def_hp_value_max,
+        'dmg_min': za_min_damage, 'dmg_max': za_result_max,
+        'ttk': za_ttk,
+    }
+
+
+def _format_value_range(min_value, max_value):
+    """実数値のブレ幅を "120～125" (同値なら "125") の形にする"""
+    return str(max_value) if min_value == max_value else f"{min_value}～{max_value}"
+
+
+def calculate_and_print_st_detailed(level, power, 
+                                    a_base, a_ev, a_nature, a_battle_mod, a_iv_choice,
+                                    d_base, d_ev, d_nature, d_battle_mod, d_iv_choice,
+                                    d_hp_base, d_hp_ev, d_hp_iv_choice,
+                                    final_correction_ratio):
+    """詳細モードの結果を計算し、Streamlitに出力する"""
+    args = (level, power,
+            a_base, a_ev, a_nature, a_battle_mod, a_iv_choice,
+            d_base, d_ev, d_nature, d_battle_mod, d_iv_choice,
+            d_hp_base, d_hp_ev, d_hp_iv_choice,
+            final_correction_ratio)
+    result = compute_detailed_result(*args)
+    record_calculation('detailed', args, result)
+
+    # 結果の整形
+    att_value_range_str = _format_value_range(result['att_min'], result['att_max'])
+    def_value_range_str = _format_value_range(result['def_min'], result['def_max'])
+    def_hp_range_str = _format_value_range(result['hp_min'], result['hp_max'])
+    za_dmg_range = f"{result['dmg_min']}～{result['dmg_max']}"
+    za_ttk = result['ttk']
     
     # 実数値のブレ幅を表示
     st.markdown(f"**--- 計算結果 (ダメージブレ幅は設定された個体値幅を考慮) ---**")
@@ -287,7 +1196,7 @@ def calculate_and_print_st_detailed(level, power,
     st.markdown(f"**--- TTK (防御側HP: {def_hp_range_str}) ---**")
     
     st.write(f"  **ZA TTK**: {za_ttk}")
-    st.caption(f"（TTKは設定HPの最大実数値 ({def_hp_value_max}) に対して計算）")
+    st.caption(f"（TTKは設定HPの最大実数値 ({result['hp_max']}) に対して計算）")
 
 # --- 6. 各計算モード関数 (詳細モード) ---
 def run_detailed_mode_st_functional():
@@ -720,9 +1629,19 @@ def run_battle_sim_mode_st():
     # ------------------------------------
     st.markdown("### 3. 技の分類と共通補正の設定")
     
-    # 技の分類選択 (新要素)
-    tech_category = st.radio("技の分類を選択", options=TECHNIQUE_CATEGORY_CHOICES, horizontal=True, index=0, key="sim_tech_category")
-    is_physical = ("物理" in tech_category)
+    # 攻撃側が自分なら、登録済みの技セットから技を選べる (威力・分類・STAB・技プラス対象を引き継ぐ)
+    my_moves = list(my_poke.get('moves', ())) if is_att_vs_def else []
+    selected_move = None
+    if my_moves:
+        move_choice = st.selectbox("登録技から選択", options=["手動入力"] + [m['name'] for m in my_moves], key="sim_move_select")
+        selected_move = next((m for m in my_moves if m['name'] == move_choice), None)
+
+    if selected_move is None:
+        # 技の分類選択 (新要素)
+        tech_category = st.radio("技の分類を選択", options=TECHNIQUE_CATEGORY_CHOICES, horizontal=True, index=0, key="sim_tech_category")
+        is_physical = ("物理" in tech_category)
+    else:
+        is_physical = (selected_move['category'] == MOVE_CATEGORY_CHOICES[0])
     
     # 技分類に基づく能力の決定
     att_stat_key = 'A' if is_physical else 'C'
@@ -734,13 +1653,22 @@ def run_battle_sim_mode_st():
     
     # 共通技設定 (パワー、STAB, 技プラス, アイテム/フィールド)
     col_power, col_stab, col_tech = st.columns(3)
-    with col_power: power = st.number_input("技の威力", min_value=1, value=100, step=1, key="sim_power")
-    with col_stab: 
-        stab_choice = st.selectbox("STAB (タイプ一致)", options=list(STAB_CHOICES.keys()), index=STAB_1_0_INDEX, key="sim_stab")
-        att_stab_mod = STAB_CHOICES[stab_choice]
+    if selected_move is None:
+        with col_power: power = st.number_input("技の威力", min_value=1, value=100, step=1, key="sim_power")
+        with col_stab: 
+            stab_choice = st.selectbox("STAB (タイプ一致)", options=list(STAB_CHOICES.keys()), index=STAB_1_0_INDEX, key="sim_stab")
+            att_stab_mod = STAB_CHOICES[stab_choice]
+    else:
+        power = selected_move['power']
+        att_stab_mod = STAB_CHOICES["タイプ一致 (1.5倍)"] if selected_move['stab'] else 1.0
+        with col_power: st.caption(f"技の威力: **{power}** ({selected_move['category']} / {selected_move['type'] or 'タイプ未設定'})")
+        with col_stab: st.caption(f"STAB: **{att_stab_mod}倍**")
     with col_tech: 
         tech_plus_choice = st.selectbox("ZA独自の補正（技プラス）", options=TECHNIQUE_PLUS_MODIFIERS, index=0, key="sim_tech_plus")
         att_tech_plus_mod = TECHNIQUE_PLUS_MODIFIERS[tech_plus_choice]
+        if selected_move is not None and not selected_move['tech_plus']:
+            att_tech_plus_mod = 1.0
+            st.caption("この技は技プラスの対象外です (1.0倍で計算)")
 
     col_item, col_wall = st.columns(2)
     with col_item: 
@@ -884,77 +1812,1449 @@ def run_battle_sim_mode_st():
     # 5. 計算実行ボタンと結果表示
     # ------------------------------------
     if st.button("一括ダメージ計算を実行", key="run_sim_calc"):
-        st.subheader("🎉 比較結果")
-        results = []
+        names, conditions, type_names, powers, stats = [], [], [], [], []
+        dmg_mins, dmg_maxs, hps = [], [], []
+        log_args = []  # 計算ログ用の入力 (compute_battle_sim_damage の引数)
         
-        # 参照する実数値を決定
+        # 参照する実数値を決定し、(条件名, 攻撃実数値 or None, 防御実数値 or None, HP or None) を並べる
+        # (None の箇所は仮想敵の値を使う)
         if is_att_vs_def:
-            # 自分の攻撃側能力値 (MAX/MIN)
-            att_max = my_stats[f'{att_stat_key}_max']
-            att_min = my_stats[f'{att_stat_key}_min']
+            # 1体攻撃 vs 3体防御: 自分の攻撃側能力値 (MAX/MIN) vs 仮想敵の防御実数値とHP
+            scenarios = [
+                (f"攻{att_stat_key} MAX", my_stats[f'{att_stat_key}_max'], None, None),
+                (f"攻{att_stat_key} MIN", my_stats[f'{att_stat_key}_min'], None, None),
+            ]
         else:
-            # 自分の防御側能力値 (MAX/MIN) とHP (MAX/MIN)
-            def_max = my_stats[f'{def_stat_key}_max']
-            def_min = my_stats[f'{def_stat_key}_min']
-            def_hp_max = my_stats['H_max']
-            def_hp_min = my_stats['H_min']
-        
-        for i, enemy in enumerate(enemy_stats):
-            final_correction_ratio = enemy['final_ratio']
-            power_i = enemy['power']
-            level = my_poke['level']
-            
-            if is_att_vs_def:
-                # 1体攻撃 vs 3体防御
-                
-                # 攻MAX vs 防御 (仮想敵) 実数値 (HPも仮想敵)
-                za_range_max, za_ttk_max = perform_damage_calc(
-                    level, power_i, att_max, enemy['stat'], enemy['hp'], final_correction_ratio
-                )
-                # 攻MIN vs 防御 (仮想敵) 実数値 (HPも仮想敵)
-                za_range_min, za_ttk_min = perform_damage_calc(
-                    level, power_i, att_min, enemy['stat'], enemy['hp'], final_correction_ratio
+            # 3体攻撃 vs 1体防御: 仮想敵の攻撃実数値 vs 自分の防御 MIN (HP MAX) / 防御 MAX (HP MIN)
+            scenarios = [
+                (f"防{def_stat_key} MIN / HP MAX", None, my_stats[f'{def_stat_key}_min'], my_stats['H_max']),
+                (f"防{def_stat_key} MAX / HP MIN", None, my_stats[f'{def_stat_key}_max'], my_stats['H_min']),
+            ]
+        
+        level = my_poke['level']
+        for enemy in enemy_stats:
+            for condition, attack, defense, hp in scenarios:
+                attack = enemy['stat'] if attack is None else attack
+                defense = enemy['stat'] if defense is None else defense
+                hp = enemy['hp'] if hp is None else hp
+                za_min_damage, za_result_max = compute_damage_range(
+                    level, enemy['power'], attack, defense, enemy['final_ratio']
                 )
-                
-                results.append({
-                    '敵ポケモン': enemy['name'],
-                    '技威力': power_i,
-                    'HP実数値': enemy['hp'],
-                    f'{def_stat_name}実数値': enemy['stat'],
-                    'タイプ相性': enemy['type_mod_name'],
-                    f'ZAダメ幅 (攻{att_stat_key} MAX)': za_range_max, 
-                    f'ZA TTK (攻{att_stat_key} MAX)': za_ttk_max,     
-                    f'ZAダメ幅 (攻{att_stat_key} MIN)': za_range_min, 
-                    f'ZA TTK (攻{att_stat_key} MIN)': za_ttk_min,     
+                names.append(enemy['name'])
+                conditions.append(condition)
+                type_names.append(enemy['type_mod_name'])
+                powers.append(enemy['power'])
+                stats.append(enemy['stat'])
+                dmg_mins.append(za_min_damage)
+                dmg_maxs.append(za_result_max)
+                hps.append(hp)
+                log_args.append((level, enemy['power'], attack, defense, hp, enemy['final_ratio']))
+        
+        results = build_damage_result_frame(
+            dmg_mins, dmg_maxs, hps,
+            labels={'name': names, 'condition': conditions, 'type': type_names},
+            values={'power': powers, 'stat': stats},
+        )
+        # 表示するテーブルの値 (ダメージ幅と発数) をそのまま記録し、リプレイで1件ずつの計算と突き合わせる
+        record_calculations('battle_sim', zip(
+            log_args, results[['dmg_min', 'dmg_max', 'hits_min', 'hits_max']].itertuples(index=False, name=None)
+        ))
+        st.session_state['sim_results'] = results
+        st.session_state['sim_results_labels'] = {
+            'name': '敵ポケモン' if is_att_vs_def else '攻撃側',
+            'condition': '条件',
+            'type': 'タイプ相性',
+            'power': '技威力',
+            'stat': f"{def_stat_name if is_att_vs_def else att_stat_name}実数値",
+            'hp': 'HP実数値',
+            'dmg_min': 'ZA最小ダメージ',
+            'dmg_max': 'ZA最大ダメージ',
+            'hits_min': '最速発数',
+            'hits_max': '確定発数',
+        }
+
+    # 並べ替え・ページ切り替えで再実行されても結果を保持する
+    if st.session_state.get('sim_results') is not None:
+        st.subheader("🎉 比較結果")
+        display_damage_result_frame(st.session_state['sim_results'], st.session_state['sim_results_labels'], key="sim_results")
+
+
+# --- 7.5 育成スイープモード (レベル/努力値の一括計算) ---
+SWEEP_AXIS_CHOICES = ["レベル × 攻撃努力値", "攻撃努力値 × 防御努力値"]
+SWEEP_EV_VALUES = np.arange(0, 253, 4)
+SWEEP_LEVEL_VALUES = np.arange(1, 101)
+SWEEP_KO_HITS = (1, 2, 3, 4)
+
+
+def compute_sweep_grid(axis, level, power, final_correction_ratio,
+                       a_base, a_nature, a_battle_mod, a_iv_choice,
+                       d_base, d_ev, d_nature, d_battle_mod, d_iv_choice,
+                       d_hp_base, d_hp_ev, d_hp_iv_choice):
+    """
+    (レベル × 攻撃EV) または (攻撃EV × 防御EV) の全マスを1回の配列計算で求める。
+    詳細モードと同じく、最小ダメージは攻MIN vs 防MAX、最大ダメージは攻MAX vs 防MIN、HPは最大値で評価する。
+    戻り値は1マス1行の DataFrame (x, y, 最小/最大ダメージ, HP, 確定/最速発数)。
+    """
+    a_iv_min, a_iv_max = get_iv_range(a_iv_choice)
+    d_iv_min, d_iv_max = get_iv_range(d_iv_choice)
+    _, d_hp_iv_max = get_iv_range(d_hp_iv_choice)
+
+    x = SWEEP_EV_VALUES
+    if axis == SWEEP_AXIS_CHOICES[0]:
+        y = SWEEP_LEVEL_VALUES
+        levels, a_evs = np.meshgrid(y, x, indexing='ij')
+        d_evs = d_ev
+    else:
+        y = SWEEP_EV_VALUES
+        d_evs, a_evs = np.meshgrid(y, x, indexing='ij')
+        levels = level
+
+    att_min = calculate_stat_value_np(a_base, a_iv_min, a_evs, levels, a_nature, a_battle_mod)
+    att_max = calculate_stat_value_np(a_base, a_iv_max, a_evs, levels, a_nature, a_battle_mod)
+    def_min = calculate_stat_value_np(d_base, d_iv_min, d_evs, levels, d_nature, d_battle_mod)
+    def_max = calculate_stat_value_np(d_base, d_iv_max, d_evs, levels, d_nature, d_battle_mod)
+    hp = np.broadcast_to(calculate_hp_value_np(d_hp_base, d_hp_iv_max, d_hp_ev, levels), att_min.shape)
+
+    dmg_max = calculate_damage_base_np(levels, power, att_max, def_min, final_correction_ratio, is_za=True)
+    dmg_min_raw = calculate_damage_base_np(levels, power, att_min, def_max, final_correction_ratio, is_za=True)
+    dmg_min = np.floor(dmg_min_raw * 0.85).astype(np.int64)
+    # calculate_ttk_hits と同じく、最小ダメージが 0 なら最速発数も 0 (倒せない) にする
+    hits_max = calculate_hits_np(dmg_min, hp)
+    hits_min = np.where(hits_max > 0, calculate_hits_np(dmg_max, hp), 0)
+
+    xs, ys = np.meshgrid(x, y)
+    return pd.DataFrame({
+        'x': xs.ravel(),
+        'y': ys.ravel(),
+        'dmg_min': dmg_min.ravel(),
+        'dmg_max': dmg_max.ravel(),
+        'hp': hp.ravel(),
+        'hits_max': hits_max.ravel(),  # 確定発数
+        'hits_min': hits_min.ravel(),  # 乱数込みの最速発数
+    })
+
+
+def sweep_ko_thresholds(grid, ko_hits=SWEEP_KO_HITS, largest=False):
+    """各 x について、確定 n 発以内になる y の境界を求める (KO 閾値の等高線)
+
+    y がレベルのときは確定 n 発になる最小のレベル、y が防御努力値のとき
+    (largest=True) は確定 n 発が維持される最大の防御努力値を返す。
+    """
+    rows = []
+    for n in ko_hits:
+        reached = grid[(grid['hits_max'] > 0) & (grid['hits_max'] <= n)]
+        grouped = reached.groupby('x', as_index=False)['y']
+        threshold = grouped.max() if largest else grouped.min()
+        threshold['ko'] = f"確定{n}発"
+        rows.append(threshold)
+    return pd.concat(rows, ignore_index=True)
+
+
+def run_sweep_mode_st():
+    st.subheader("📈 育成スイープモード: レベル/努力値ごとのダメージと確定数")
+
+    with st.form("sweep_form"):
+        axis = st.radio("スイープする軸", SWEEP_AXIS_CHOICES, horizontal=True, key="sweep_axis")
+        level = st.number_input("ポケモンのレベル (攻撃努力値 × 防御努力値 のとき使用)", min_value=1, max_value=100, value=50, step=1, key="sweep_level")
+
+        st.markdown("#### ⚔️ 攻撃側の設定")
+        col_a_base, col_a_n, col_a_bm, col_a_iv = st.columns(4)
+        with col_a_base: a_base = st.number_input("攻撃/特攻 種族値", min_value=1, value=120, key="sweep_a_base")
+        with col_a_n: a_nature_choice = st.selectbox("性格補正", options=NATURE_CHOICES, index=0, key="sweep_a_n")
+        with col_a_bm: a_battle_choice = st.selectbox("戦闘中補正", options=BATTLE_CHOICES, index=0, key="sweep_a_bm")
+        with col_a_iv: a_iv_choice = st.selectbox("個体値", options=IV_CHOICES, key="sweep_a_iv")
+
+        st.markdown("#### ⚙️ 技と補正の設定")
+        col_power, col_tech, col_stab, col_type, col_item = st.columns(5)
+        with col_power: power = st.number_input("技の威力", min_value=1, value=100, step=1, key="sweep_power")
+        with col_tech: tech_plus_choice = st.selectbox("技プラス補正", options=TECHNIQUE_PLUS_CHOICES, index=0, key="sweep_tech")
+        with col_stab: stab_choice = st.selectbox("STAB (タイプ一致)", options=list(STAB_CHOICES.keys()), index=STAB_1_0_INDEX, key="sweep_stab")
+        with col_type: type_choice = st.selectbox("タイプ相性", options=list(TYPE_EFFECTIVENESS_CHOICES.keys()), index=TYPE_1_0_INDEX, key="sweep_type")
+        with col_item: other_choice = st.selectbox("道具・フィールド補正", options=list(OTHER_ITEM_FIELD_MODIFIER_CHOICES.keys()), index=OTHER_1_0_INDEX, key="sweep_other")
+        other_mod = OTHER_ITEM_FIELD_MODIFIER_CHOICES[other_choice]
+        if other_choice == "その他 (任意)":
+            other_mod = st.number_input("任意補正倍率", min_value=0.0, value=1.0, step=0.1, key="sweep_other_custom")
+        wall_mod_select = st.radio("壁の適用方法", ["壁なし (1.0)", "壁あり (0.5)"], horizontal=True, index=0, key="sweep_wall_apply_simple")
+
+        st.markdown("#### 🛡️ 防御側の設定")
+        col_d_base, col_d_ev, col_d_n, col_d_bm, col_d_iv = st.columns(5)
+        with col_d_base: d_base = st.number_input("防御/特防 種族値", min_value=1, value=100, key="sweep_d_base")
+        with col_d_ev: d_ev = st.number_input("防御/特防 努力値 (レベル × 攻撃努力値 のとき使用)", min_value=0, max_value=252, value=252, step=4, key="sweep_d_ev")
+        with col_d_n: d_nature_choice = st.selectbox("防御/特防 性格補正", options=NATURE_CHOICES, index=0, key="sweep_d_n")
+        with col_d_bm: d_battle_choice = st.selectbox("防御/特防 戦闘中補正", options=BATTLE_CHOICES, index=0, key="sweep_d_bm")
+        with col_d_iv: d_iv_choice = st.selectbox("防御/特防 個体値", options=IV_CHOICES, key="sweep_d_iv")
+
+        col_hp_base, col_hp_ev, col_hp_iv = st.columns(3)
+        with col_hp_base: d_hp_base = st.number_input("HP 種族値", min_value=1, value=90, key="sweep_d_hp_base")
+        with col_hp_ev: d_hp_ev = st.number_input("HP 努力値 (0～252)", min_value=0, max_value=252, value=252, step=4, key="sweep_d_hp_ev")
+        with col_hp_iv: d_hp_iv_choice = st.selectbox("HP 個体値", options=IV_CHOICES, key="sweep_d_hp_iv")
+
+        submitted = st.form_submit_button("スイープを実行")
+
+    if not submitted:
+        return
+
+    wall_mod = WALL_MODIFIER if "0.5" in wall_mod_select else 1.0
+    final_correction_ratio = (STAB_CHOICES[stab_choice] * TYPE_EFFECTIVENESS_CHOICES[type_choice]
+                              * other_mod * wall_mod
+                              * TECHNIQUE_PLUS_MODIFIERS[tech_plus_choice])
+
+    grid = compute_sweep_grid(
+        axis, level, power, final_correction_ratio,
+        a_base, NATURE_MODIFIERS[a_nature_choice], BATTLE_MODIFIERS[a_battle_choice], a_iv_choice,
+        d_base, d_ev, NATURE_MODIFIERS[d_nature_choice], BATTLE_MODIFIERS[d_battle_choice], d_iv_choice,
+        d_hp_base, d_hp_ev, d_hp_iv_choice,
+    )
+    by_defense = axis == SWEEP_AXIS_CHOICES[1]
+    thresholds = sweep_ko_thresholds(grid, largest=by_defense)
+
+    x_title = "攻撃努力値"
+    y_title = "防御努力値" if by_defense else "レベル"
+    st.caption(f"**最終補正倍率**: {final_correction_ratio:.3f} / 計算マス数: {len(grid)}")
+
+    heatmap = alt.Chart(grid).mark_rect().encode(
+        x=alt.X('x:O', title=x_title),
+        y=alt.Y('y:O', title=y_title, sort='descending'),
+        color=alt.Color('dmg_min:Q', title="最小ダメージ", scale=alt.Scale(scheme='viridis')),
+        tooltip=[alt.Tooltip('x', title=x_title), alt.Tooltip('y', title=y_title),
+                 alt.Tooltip('dmg_min', title="最小ダメージ"), alt.Tooltip('dmg_max', title="最大ダメージ"),
+                 alt.Tooltip('hp', title="HP"), alt.Tooltip('hits_max', title="確定発数")],
+    )
+    contours = alt.Chart(thresholds).mark_line(interpolate='step-after', strokeWidth=2).encode(
+        x=alt.X('x:O', title=x_title),
+        y=alt.Y('y:O', title=y_title, sort='descending'),
+        color=alt.Color('ko:N', title="KO 閾値", scale=alt.Scale(scheme='reds')),
+    )
+    st.altair_chart(heatmap + contours, use_container_width=True)
+
+    if by_defense:
+        st.markdown(f"##### KO 閾値 (確定 n 発が維持される最大の{y_title})")
+    else:
+        st.markdown(f"##### KO 閾値 (確定 n 発になる最小の{y_title})")
+    st.dataframe(
+        thresholds.pivot(index='x', columns='ko', values='y').rename_axis(x_title),
+        use_container_width=True,
+    )
+
+# --- 7.6 レイドバトルシミュレーター (リアルタイム戦闘のモンテカルロ) ---
+RAID_DAMAGE_ROLLS = tuple(range(85, 101))  # 乱数 85%～100% の16段階
+RAID_TIME_LIMIT = 600.0  # 秒。これを超えたら未討伐として扱う
+RAID_MAX_ATTACKERS = 4
+
+
+def raid_damage_table(attacker, boss_defense):
+    """アタッカー1体がボスに与える乱数16段階のダメージ (ZA補正込み)"""
+    damage_max = calculate_damage_base(
+        attacker['level'], attacker['power'], attacker['attack'], boss_defense,
+        attacker['final_ratio'], is_za=True
+    )
+    return tuple(math.floor(damage_max * roll / 100) for roll in RAID_DAMAGE_ROLLS)
+
+
+def compile_raid_plan(attackers, boss_defense):
+    """
+    アタッカー設定をシミュレーション用のタプル
+    (初回命中時刻, 命中間隔, 操作のばらつき, ダメージ表) のリストに変換する。
+    命中間隔が 0 のアタッカーは同じ時刻に無限に命中してしまうため ValueError にする。
+    """
+    for a in attackers:
+        if a['cast_time'] + a['cooldown'] <= 0:
+            raise ValueError(f"{a['name']} の詠唱時間とクールダウンが両方 0 です。どちらかを 0 より大きくしてください。")
+    return [
+        (a['start_delay'] + a['cast_time'], a['cooldown'] + a['cast_time'], a['jitter'],
+         raid_damage_table(a, boss_defense))
+        for a in attackers
+    ]
+
+
+def simulate_raid_fight(plan, boss_hp, rng, time_limit=RAID_TIME_LIMIT):
+    """
+    イベントキュー (ヒープ) で1戦をシミュレートし、討伐時刻 (秒) を返す。時間切れなら None。
+    各アタッカーは「詠唱 (cast_time) → 命中 → クールダウン (cooldown) → 次の詠唱」を繰り返し、
+    次の詠唱開始は 0～jitter 秒ランダムに遅れる。
+    """
+    queue = [(first_hit, i) for i, (first_hit, _, _, _) in enumerate(plan)]
+    if not queue:
+        return None
+    heapq.heapify(queue)
+    hp = boss_hp
+    random_ = rng.random
+    heapreplace = heapq.heapreplace
+    n_rolls = len(RAID_DAMAGE_ROLLS)
+    while True:
+        t, i = queue[0]
+        if t > time_limit:
+            return None
+        _, interval, jitter, table = plan[i]
+        hp -= table[int(random_() * n_rolls)]
+        if hp <= 0:
+            return t
+        # 命中したアタッカーの次の命中イベントで先頭を置き換える (pop + push を1回のふるい分けで)
+        heapreplace(queue, (t + interval + jitter * random_(), i))
+
+
+def simulate_raid_chunk(attackers, boss, trials, seed, time_limit=RAID_TIME_LIMIT):
+    """trials 回の戦闘をシミュレートし、討伐時刻のリスト (未討伐は nan) を返す"""
+    rng = random.Random(seed)
+    plan = compile_raid_plan(attackers, boss['defense'])
+    if not any(any(table) for _, _, _, table in plan):
+        return [math.nan] * trials  # 誰もダメージを与えられない
+    results = []
+    for _ in range(trials):
+        t = simulate_raid_fight(plan, boss['hp'], rng, time_limit)
+        results.append(math.nan if t is None else t)
+    return results
+
+
+def run_raid_monte_carlo(attackers, boss, trials, seed=None, workers=1, time_limit=RAID_TIME_LIMIT):
+    """
+    モンテカルロで討伐時刻の分布を求める。workers > 1 ならプロセスプールで並列実行する。
+    戻り値は長さ trials の numpy 配列 (未討伐は nan)。
+    """
+    seed = random.randrange(2 ** 32) if seed is None else seed
+    if workers <= 1:
+        return np.array(simulate_raid_chunk(attackers, boss, trials, seed, time_limit))
+
+    compile_raid_plan(attackers, boss['defense'])  # 設定の誤りはプロセスを起動する前に ValueError にする
+    chunk_func = get_process_pool_function(simulate_raid_chunk)
+    chunk_sizes = [trials // workers + (1 if i < trials % workers else 0) for i in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(chunk_func, attackers, boss, n, seed + i, time_limit)
+            for i, n in enumerate(chunk_sizes) if n > 0
+        ]
+        return np.array([t for future in futures for t in future.result()])
+
+
+def summarize_raid_times(times):
+    """討伐時刻の配列から討伐率・平均・パーセンタイルをまとめる"""
+    cleared = times[~np.isnan(times)]
+    summary = {'試行回数': len(times), '討伐率': len(cleared) / len(times) if len(times) else 0.0}
+    if len(cleared):
+        summary['平均 (秒)'] = float(cleared.mean())
+        for q in (5, 50, 95):
+            summary[f'{q}% (秒)'] = float(np.percentile(cleared, q))
+        summary['最速 (秒)'] = float(cleared.min())
+        summary['最遅 (秒)'] = float(cleared.max())
+    return summary
+
+
+def run_raid_sim_mode_st():
+    st.subheader("🐉 レイドバトルシミュレーター (リアルタイム戦闘)")
+    st.caption(f"ダメージには ZA補正係数 ({ZA_CORRECTION_RATIO:.6f}) を適用し、乱数は85%～100%の16段階から毎回抽選します。")
+
+    with st.form("raid_sim_form"):
+        st.markdown("#### 🐉 ボスの設定")
+        col_hp, col_def = st.columns(2)
+        with col_hp: boss_hp = st.number_input("ボスHP実数値", min_value=1, value=3000, step=100, key="raid_boss_hp")
+        with col_def: boss_def = st.number_input("ボス防御/特防 実数値", min_value=1, value=150, step=1, key="raid_boss_def")
+
+        st.markdown("#### ⚔️ アタッカーの設定")
+        n_attackers = st.slider("アタッカー数", min_value=1, max_value=RAID_MAX_ATTACKERS, value=RAID_MAX_ATTACKERS, key="raid_n_attackers")
+        attackers = []
+        for i in range(1, RAID_MAX_ATTACKERS + 1):
+            st.markdown(f"##### アタッカー {i}")
+            col_name, col_level, col_att, col_power = st.columns(4)
+            with col_name: name = st.text_input("名前", value=f"アタッカー{i}", key=f"raid_{i}_name")
+            with col_level: level = st.number_input("レベル", min_value=1, max_value=100, value=50, step=1, key=f"raid_{i}_level")
+            with col_att: attack = st.number_input("攻撃/特攻 実数値", min_value=1, value=150, step=1, key=f"raid_{i}_att")
+            with col_power: power = st.number_input("技の威力", min_value=1, value=90, step=1, key=f"raid_{i}_power")
+
+            col_stab, col_type, col_tech = st.columns(3)
+            with col_stab: stab_choice = st.selectbox("STAB", options=list(STAB_CHOICES.keys()), index=STAB_1_0_INDEX, key=f"raid_{i}_stab")
+            with col_type: type_choice = st.selectbox("タイプ相性", options=list(TYPE_EFFECTIVENESS_CHOICES.keys()), index=TYPE_1_0_INDEX, key=f"raid_{i}_type")
+            with col_tech: tech_plus_choice = st.selectbox("技プラス補正", options=TECHNIQUE_PLUS_CHOICES, index=0, key=f"raid_{i}_tech")
+
+            col_cast, col_cd, col_delay, col_jitter = st.columns(4)
+            with col_cast: cast_time = st.number_input("詠唱時間 (秒)", min_value=0.0, value=1.0, step=0.1, key=f"raid_{i}_cast")
+            with col_cd: cooldown = st.number_input("クールダウン (秒)", min_value=0.0, value=3.0, step=0.1, key=f"raid_{i}_cd")
+            with col_delay: start_delay = st.number_input("開始遅延 (秒)", min_value=0.0, value=0.0, step=0.1, key=f"raid_{i}_delay")
+            with col_jitter: jitter = st.number_input("操作のばらつき (秒)", min_value=0.0, value=0.5, step=0.1, key=f"raid_{i}_jitter")
+
+            if i <= n_attackers:
+                attackers.append({
+                    'name': name, 'level': level, 'attack': attack, 'power': power,
+                    'final_ratio': STAB_CHOICES[stab_choice] * TYPE_EFFECTIVENESS_CHOICES[type_choice] * TECHNIQUE_PLUS_MODIFIERS[tech_plus_choice],
+                    'cast_time': cast_time, 'cooldown': cooldown, 'start_delay': start_delay, 'jitter': jitter,
                 })
 
+        st.markdown("#### 🎲 試行設定")
+        col_trials, col_workers, col_seed = st.columns(3)
+        with col_trials: trials = st.number_input("試行回数", min_value=100, max_value=1_000_000, value=10_000, step=1000, key="raid_trials")
+        with col_workers: workers = st.number_input("並列プロセス数", min_value=1, max_value=os.cpu_count() or 1, value=1, step=1, key="raid_workers")
+        with col_seed: seed = st.number_input("乱数シード", min_value=0, value=0, step=1, key="raid_seed")
+
+        submitted = st.form_submit_button("シミュレーションを実行")
+
+    if not submitted:
+        return
+
+    boss = {'hp': boss_hp, 'defense': boss_def}
+    try:
+        compile_raid_plan(attackers, boss_def)
+    except ValueError as e:
+        st.error(str(e))
+        return
+
+    st.dataframe(pd.DataFrame([
+        {'アタッカー': a['name'], 'ダメージ (乱数最小～最大)': f"{table[0]}～{table[-1]}", '補正倍率': round(a['final_ratio'], 3)}
+        for a, table in ((a, raid_damage_table(a, boss_def)) for a in attackers)
+    ]), use_container_width=True)
+
+    start = time.perf_counter()
+    times = run_raid_monte_carlo(attackers, boss, int(trials), seed=int(seed), workers=int(workers))
+    elapsed = time.perf_counter() - start
+
+    summary = summarize_raid_times(times)
+    st.caption(f"{len(times):,} 戦を {elapsed:.2f} 秒でシミュレート ({len(times) / elapsed:,.0f} 戦/秒)")
+    st.dataframe(pd.DataFrame([summary]), use_container_width=True)
+
+    cleared = times[~np.isnan(times)]
+    if len(cleared):
+        histogram = alt.Chart(pd.DataFrame({'clear_time': cleared})).mark_bar().encode(
+            x=alt.X('clear_time:Q', bin=alt.Bin(maxbins=60), title="討伐時間 (秒)"),
+            y=alt.Y('count()', title="回数"),
+        )
+        st.altair_chart(histogram, use_container_width=True)
+    else:
+        st.warning(f"{RAID_TIME_LIMIT:.0f} 秒以内に討伐できた試行がありません。")
+
+# --- 7.7 技セット比較モード (最適技の自動選択) ---
+MOVESET_MATRIX_LABELS = {
+    'attacker': '攻撃側', 'defender': '防御側', 'move': '最適技', 'hp': 'HP実数値',
+    'dmg_min': 'ZA最小ダメージ', 'dmg_max': 'ZA最大ダメージ', 'hits_min': '最速発数', 'hits_max': '確定発数',
+}
+
+
+@persistent_cache
+def best_move_matrix(attackers, defenders, att_ev, def_ev, tech_plus_mod=1.0, other_mod=1.0, wall_mod=1.0, criterion=None):
+    """
+    技セットを持つアタッカー × 防御側 の全組み合わせについて最適技を求める。
+    技セットの前計算はアタッカーごとに1回、評価は1組につき1回の配列計算で行う (タイプ相性は等倍)。
+    戻り値は build_damage_result_frame の数値テーブル (1組1行)。
+    """
+    att_entries = [
+        (p, get_stats_from_settings(p, att_ev, {}, {}, p['level'], True),
+         prepare_moveset(p['moves'], tech_plus_mod, other_mod, wall_mod))
+        for p in attackers if p.get('moves')
+    ]
+    def_entries = [(p, get_stats_from_settings(p, def_ev, {}, {}, p['level'], False)) for p in defenders]
+
+    attacker_names, defender_names, move_names = [], [], []
+    dmg_mins, dmg_maxs, hps = [], [], []
+    for att_p, att_stats, moveset in att_entries:
+        for def_p, def_stats in def_entries:
+            evaluation = evaluate_moveset_np(att_p['level'], att_stats, def_stats, moveset)
+            best = select_best_move(evaluation, criterion)
+            attacker_names.append(att_p['name'])
+            defender_names.append(def_p['name'])
+            move_names.append(moveset['names'][best])
+            dmg_mins.append(evaluation['dmg_min'][best])
+            dmg_maxs.append(evaluation['dmg_max'][best])
+            hps.append(def_stats['H_max'])
+    return build_damage_result_frame(
+        dmg_mins, dmg_maxs, hps,
+        labels={'attacker': attacker_names, 'defender': defender_names, 'move': move_names},
+    )
+
+
+def run_moveset_mode_st():
+    st.subheader("🎯 技セット比較モード: 登録技から最適な技を選ぶ")
+
+    pokemons = st.session_state.my_pokemons
+    attackers = [p for p in pokemons if p.get('moves')]
+    if not attackers:
+        st.warning("技セットを持つマイポケモンがいません。「マイポケモン管理」で技を登録してください。")
+        return
+
+    col_att, col_def = st.columns(2)
+    with col_att:
+        att_index = st.selectbox("攻撃側 (技セットあり)", options=range(len(attackers)), format_func=lambda i: attackers[i]['name'], key="moveset_att")
+    with col_def:
+        def_index = st.selectbox("防御側", options=range(len(pokemons)), format_func=lambda i: pokemons[i]['name'], key="moveset_def")
+    att_p, def_p = attackers[att_index], pokemons[def_index]
+
+    st.markdown("##### 努力値 (性格・能力変化は補正なし)")
+    ev_cols = st.columns(5)
+    att_ev, def_ev = {}, {}
+    for col, (role_ev, stat, label) in zip(ev_cols, [(att_ev, 'A', "攻撃側 A"), (att_ev, 'C', "攻撃側 C"),
+                                                       (def_ev, 'H', "防御側 H"), (def_ev, 'B', "防御側 B"), (def_ev, 'D', "防御側 D")]):
+        with col:
+            role_ev[stat] = st.number_input(f"{label} EV", min_value=0, max_value=252, value=252 if stat in ['A', 'C'] else 0, step=4, key=f"moveset_ev_{label}")
+
+    col_tech, col_other, col_wall, col_criterion = st.columns(4)
+    with col_tech: tech_plus_mod = TECHNIQUE_PLUS_MODIFIERS[st.selectbox("技プラス補正 (対象技のみ)", options=TECHNIQUE_PLUS_CHOICES, index=1, key="moveset_tech")]
+    with col_other: other_mod = OTHER_ITEM_FIELD_MODIFIER_CHOICES[st.selectbox("道具・フィールド補正", options=list(OTHER_ITEM_FIELD_MODIFIER_CHOICES.keys()), index=OTHER_1_0_INDEX, key="moveset_other")]
+    with col_wall: wall_mod = WALL_MODIFIER if "0.5" in st.radio("壁", ["壁なし (1.0)", "壁あり (0.5)"], horizontal=True, key="moveset_wall") else 1.0
+    with col_criterion: criterion = st.radio("最適技の基準", BEST_MOVE_CRITERIA, key="moveset_criterion")
+
+    # 技タイプごとに防御側への相性を設定する
+    move_types = list(dict.fromkeys(m['type'] for m in att_p['moves'] if m['type']))
+    type_mods = {}
+    if move_types:
+        st.markdown(f"##### {def_p['name']} への技タイプ別の相性")
+        type_cols = st.columns(len(move_types))
+        for col, move_type in zip(type_cols, move_types):
+            with col:
+                type_choice = st.selectbox(move_type, options=list(TYPE_EFFECTIVENESS_CHOICES.keys()), index=TYPE_1_0_INDEX, key=f"moveset_type_{move_type}")
+                type_mods[move_type] = TYPE_EFFECTIVENESS_CHOICES[type_choice]
+
+    att_stats = get_stats_from_settings(att_p, att_ev, {}, {}, att_p['level'], True)
+    def_stats = get_stats_from_settings(def_p, def_ev, {}, {}, def_p['level'], False)
+    moveset = prepare_moveset(att_p['moves'], tech_plus_mod, other_mod, wall_mod, type_mods)
+    evaluation = evaluate_moveset_np(att_p['level'], att_stats, def_stats, moveset)
+    best = select_best_move(evaluation, criterion)
+
+    st.success(f"最適技: **{moveset['names'][best]}** ({criterion})")
+    st.dataframe(pd.DataFrame([
+        {
+            '最適': "★" if i == best else "",
+            '技': m['name'],
+            '威力': m['power'],
+            '分類': m['category'],
+            'タイプ': m['type'],
+            '補正倍率': round(float(moveset['ratio'][i]), 3),
+            'ZAダメ幅': f"{evaluation['dmg_min'][i]}～{evaluation['dmg_max'][i]}",
+            'ZA TTK': calculate_ttk(int(evaluation['dmg_min'][i]), int(evaluation['dmg_max'][i]), def_stats['H_max']),
+        }
+        for i, m in enumerate(att_p['moves'])
+    ]), use_container_width=True)
+
+    st.markdown("---")
+    st.markdown("##### マイポケモン全体の最適技マトリクス (タイプ相性は等倍)")
+    if st.button("マトリクスを計算", key="moveset_matrix_btn"):
+        st.session_state['moveset_matrix'] = best_move_matrix(pokemons, pokemons, att_ev, def_ev, tech_plus_mod, other_mod, wall_mod, criterion)
+    if st.session_state.get('moveset_matrix') is not None:
+        display_damage_result_frame(st.session_state['moveset_matrix'], MOVESET_MATRIX_LABELS, key="moveset_matrix")
+
+# --- 7.8 補正組み合わせスイープ (実効倍率で重複を除いて一括計算) ---
+WALL_CHOICES = {"壁なし (1.0)": 1.0, "壁あり (0.5)": WALL_MODIFIER}
+MODIFIER_SWEEP_LABELS = {
+    'stab': 'STAB', 'type': 'タイプ相性', 'other': '道具・フィールド', 'tech_plus': '技プラス', 'wall': '壁',
+    'att_battle': '攻撃側 能力変化', 'def_battle': '防御側 能力変化', 'ratio_x1000': '最終補正倍率 (×1000)',
+    'hp': 'HP実数値', 'dmg_min': 'ZA最小ダメージ', 'dmg_max': 'ZA最大ダメージ', 'hits_min': '最速発数', 'hits_max': '確定発数',
+}
+
+
+@st.cache_resource
+def get_modifier_combinations():
+    """
+    STAB × タイプ相性 × 道具 × 技プラス × 壁 × 能力変化 (攻/防) の全組み合わせと、
+    組み合わせごとの最終補正倍率・実効キーを返す (全セッション共有・読み取り専用)。
+    「その他 (任意)」は任意入力用のため除外する。
+    """
+    axes = [
+        ('stab', STAB_CHOICES),
+        ('type', TYPE_EFFECTIVENESS_CHOICES),
+        ('other', {k: v for k, v in OTHER_ITEM_FIELD_MODIFIER_CHOICES.items() if k != "その他 (任意)"}),
+        ('tech_plus', TECHNIQUE_PLUS_MODIFIERS),
+        ('wall', WALL_CHOICES),
+        ('att_battle', BATTLE_MODIFIERS),
+        ('def_battle', BATTLE_MODIFIERS),
+    ]
+    combos = list(itertools.product(*(choices.items() for _, choices in axes)))
+    labels = {name: pd.Categorical([combo[i][0] for combo in combos], categories=list(choices)) for i, (name, choices) in enumerate(axes)}
+    mods = {name: np.array([combo[i][1] for combo in combos]) for i, (name, _) in enumerate(axes)}
+
+    # 各モードと同じ順序 (STAB × 相性 × 道具 × 壁 × 技プラス) で掛ける
+    ratio = mods['stab'] * mods['type'] * mods['other'] * mods['wall'] * mods['tech_plus']
+    # 結果を決めるのは (最終補正倍率, 攻撃側能力変化, 防御側能力変化) の3つだけ
+    effective_keys, inverse = np.unique(
+        np.column_stack([ratio, mods['att_battle'], mods['def_battle']]), axis=0, return_inverse=True
+    )
+    return labels, ratio, effective_keys, inverse.ravel()
+
+
+def evaluate_modifier_sweep(level, power, attack, defense, def_hp):
+    """
+    全補正組み合わせのダメージと確定数を求める。同じ実効キーを持つ組み合わせは1回だけ計算し、結果を共有する。
+    攻撃/防御は能力変化前の実数値 (簡単モードと同じく、能力変化は実数値に掛けて切り捨てる)。
+    """
+    labels, ratio, effective_keys, inverse = get_modifier_combinations()
+    key_ratio, key_att_battle, key_def_battle = effective_keys.T
+
+    final_attack = np.floor(attack * key_att_battle)
+    final_defense = np.floor(defense * key_def_battle)
+    dmg_max = calculate_damage_base_np(level, power, final_attack, final_defense, key_ratio, is_za=True)
+    dmg_min = np.floor(dmg_max * 0.85).astype(np.int64)
+
+    return build_damage_result_frame(
+        dmg_min[inverse], dmg_max[inverse], np.full(len(inverse), def_hp),
+        labels=labels,
+        values={'ratio_x1000': np.round(ratio * 1000)},
+    )
+
+
+def run_modifier_sweep_mode_st():
+    st.subheader("🧮 補正組み合わせスイープ: 全補正パターンのダメージ/確定数")
+    st.caption("STAB・タイプ相性・道具/フィールド・技プラス・壁・能力変化 (攻/防) の全組み合わせを計算します。最終的な倍率が同じ組み合わせは1回だけ計算します。")
+
+    with st.form("modifier_sweep_form"):
+        col_level, col_power, col_att, col_def, col_hp = st.columns(5)
+        with col_level: level = st.number_input("ポケモンのレベル", min_value=1, max_value=100, value=50, step=1, key="msweep_level")
+        with col_power: power = st.number_input("技の威力", min_value=1, value=100, step=1, key="msweep_power")
+        with col_att: attack = st.number_input("攻撃実数値 (A or C)", min_value=1, value=150, step=1, key="msweep_att")
+        with col_def: defense = st.number_input("防御実数値 (B or D)", min_value=1, value=130, step=1, key="msweep_def")
+        with col_hp: def_hp = st.number_input("防御側HP実数値", min_value=1, value=200, step=1, key="msweep_hp")
+        submitted = st.form_submit_button("スイープを実行")
+
+    if submitted:
+        start = time.perf_counter()
+        st.session_state['modifier_sweep'] = evaluate_modifier_sweep(level, power, attack, defense, def_hp)
+        elapsed = time.perf_counter() - start
+        _, _, effective_keys, inverse = get_modifier_combinations()
+        st.caption(f"{len(inverse):,} 通りの組み合わせ → 実効倍率 {len(effective_keys):,} 通りを計算 ({elapsed * 1000:.1f} ms)")
+
+    if st.session_state.get('modifier_sweep') is not None:
+        display_damage_result_frame(st.session_state['modifier_sweep'], MODIFIER_SWEEP_LABELS, key="modifier_sweep")
+
+# --- 7.9 チーム選出最適化 (仮想敵リストに対する分枝限定法) ---
+TEAM_OBJECTIVE_CHOICES = ("確定KOできる仮想敵の数を最大", "確定1発で倒される回数を最小", "重み付きスコア")
+TEAM_SIZE_CHOICES = (3, 6)
+
+
+def _generic_move(p, power):
+    """技セットを持たないポケモン用の汎用技 (参照能力に合わせた分類・タイプ一致)"""
+    category = MOVE_CATEGORY_CHOICES[0] if p.get('att_stat_name', '攻撃') == '攻撃' else MOVE_CATEGORY_CHOICES[1]
+    return {'name': "(汎用技)", 'power': power, 'category': category, 'type': '', 'stab': True, 'tech_plus': False}
+
+
+@persistent_cache
+def team_pairwise_hits(members, threats, att_ev, def_ev, default_power=80, tech_plus_mod=1.0):
+    """
+    メンバー × 仮想敵 の確定発数行列を双方向に求める (各組で確定数が最少の技を使う。0 = 倒せない)。
+    戻り値は (offense[メンバー, 仮想敵], defense[仮想敵, メンバー])。
+    """
+    def profile(p):
+        moves = p.get('moves') or [_generic_move(p, default_power)]
+        return (p['level'],
+                get_stats_from_settings(p, att_ev, {}, {}, p['level'], True),
+                get_stats_from_settings(p, def_ev, {}, {}, p['level'], False),
+                prepare_moveset(moves, tech_plus_mod))
+
+    def hits_matrix(attackers, defenders):
+        matrix = np.zeros((len(attackers), len(defenders)), dtype=np.int64)
+        for i, (level, att_stats, _, moveset) in enumerate(attackers):
+            for j, (_, _, def_stats, _) in enumerate(defenders):
+                evaluation = evaluate_moveset_np(level, att_stats, def_stats, moveset)
+                matrix[i, j] = evaluation['hits_max'][select_best_move(evaluation, BEST_MOVE_CRITERIA[1])]
+        return matrix
+
+    member_profiles = [profile(p) for p in members]
+    threat_profiles = [profile(p) for p in threats]
+    return hits_matrix(member_profiles, threat_profiles), hits_matrix(threat_profiles, member_profiles)
+
+
+def team_objective_weights(objective, n_threats, team_size, weights=(1.0, 1.0)):
+    """目的関数 (w_cov × KOできる仮想敵数 - w_ohko × 確定1発で倒される回数) の重みを返す"""
+    if objective == TEAM_OBJECTIVE_CHOICES[0]:
+        # KO数を優先し、同数なら倒される回数が少ない方
+        return float(team_size * n_threats + 1), 1.0
+    if objective == TEAM_OBJECTIVE_CHOICES[1]:
+        # 倒される回数を優先し、同数なら KO数が多い方
+        return 1.0, float(n_threats + 1)
+    return float(weights[0]), float(weights[1])
+
+
+def _team_search(masks, penalties, w_cov, w_ohko, team_size, n_threats, first_choices, incumbent):
+    """
+    分枝限定法の本体。first_choices の各メンバーを最初に選んだ部分木を探索し、(スコア, インデックス) を返す。
+    上界は「残り枠で新たに KO できる数の上位和 (仮想敵の総数まで)」と「残り候補の倒され回数の下位和」から求める。
+    """
+    n = len(masks)
+    best_score, best_team = incumbent
+    nodes = 0
+
+    def dfs(start, chosen, covered, penalty_sum):
+        nonlocal best_score, best_team, nodes
+        nodes += 1
+        remaining = team_size - len(chosen)
+        n_covered = covered.bit_count()
+        if remaining == 0:
+            score = w_cov * n_covered - w_ohko * penalty_sum
+            if score > best_score:
+                best_score, best_team = score, tuple(chosen)
+            return
+        if n - start < remaining:
+            return
+        gains = heapq.nlargest(remaining, ((masks[k] & ~covered).bit_count() for k in range(start, n)))
+        min_penalty = sum(heapq.nsmallest(remaining, penalties[start:]))
+        bound = w_cov * min(n_threats, n_covered + sum(gains)) - w_ohko * (penalty_sum + min_penalty)
+        if bound <= best_score:
+            return
+        for k in range(start, n - remaining + 1):
+            chosen.append(k)
+            dfs(k + 1, chosen, covered | masks[k], penalty_sum + penalties[k])
+            chosen.pop()
+
+    for first in first_choices:
+        dfs(first + 1, [first], masks[first], penalties[first])
+    return best_score, best_team, nodes
+
+
+def optimize_team(offense, defense, team_size, objective, ko_hits=1, weights=(1.0, 1.0), workers=1):
+    """
+    ペアごとの確定発数行列から最適なチームを分枝限定法で探索する。
+    戻り値は (メンバーのインデックス, スコア, 探索ノード数)。
+    """
+    n_members, n_threats = offense.shape
+    team_size = min(team_size, n_members)
+    w_cov, w_ohko = team_objective_weights(objective, n_threats, team_size, weights)
+
+    cover = (offense > 0) & (offense <= ko_hits)
+    all_masks = [sum(1 << j for j in np.flatnonzero(row)) for row in cover]
+    all_penalties = [int(v) for v in (defense == 1).sum(axis=0)]
+
+    # 同じ性能のメンバーはチーム枠数を超えて探索しても意味がないため間引く
+    candidates, profile_count = [], {}
+    for i in range(n_members):
+        profile = (all_masks[i], all_penalties[i])
+        if profile_count.get(profile, 0) < team_size:
+            profile_count[profile] = profile_count.get(profile, 0) + 1
+            candidates.append(i)
+    # 単体スコアの高い順に並べ、良い解を早く見つけて枝刈りを効かせる
+    candidates.sort(key=lambda i: w_cov * all_masks[i].bit_count() - w_ohko * all_penalties[i], reverse=True)
+    masks = [all_masks[i] for i in candidates]
+    penalties = [all_penalties[i] for i in candidates]
+
+    # 貪欲法の解を初期の暫定解にする
+    greedy, covered, penalty_sum = [], 0, 0
+    for _ in range(team_size):
+        k = max((k for k in range(len(masks)) if k not in greedy),
+                key=lambda k: w_cov * (masks[k] & ~covered).bit_count() - w_ohko * penalties[k])
+        greedy.append(k)
+        covered |= masks[k]
+        penalty_sum += penalties[k]
+    incumbent = (w_cov * covered.bit_count() - w_ohko * penalty_sum, tuple(sorted(greedy)))
+
+    first_choices = list(range(len(masks) - team_size + 1))
+    if workers <= 1:
+        results = [_team_search(masks, penalties, w_cov, w_ohko, team_size, n_threats, first_choices, incumbent)]
+    else:
+        search_func = get_process_pool_function(_team_search)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(search_func, masks, penalties, w_cov, w_ohko, team_size, n_threats, first_choices[w::workers], incumbent)
+                for w in range(workers)
+            ]
+            results = [future.result() for future in futures]
+
+    best_score, best_team, _ = max(results, key=lambda r: r[0])
+    nodes = sum(r[2] for r in results)
+    return [candidates[k] for k in best_team], best_score, nodes
+
+
+def run_team_optimizer_mode_st():
+    st.subheader("🏆 チーム選出最適化: 仮想敵リストに対するベストメンバー")
+
+    pokemons = st.session_state.my_pokemons
+    if len(pokemons) < 2:
+        st.warning("マイポケモンを2体以上登録してください。")
+        return
+
+    st.caption("仮想敵はマイポケモンから選びます。仮想敵に選んだポケモンは選出候補から除き、残りのマイポケモンから選出します。")
+    with st.form("team_optimizer_form"):
+        threat_indices = st.multiselect(
+            "仮想敵 (マイポケモンから選択)", options=range(len(pokemons)), default=[],
+            format_func=lambda i: pokemons[i]['name'], key="team_threats"
+        )
+        col_size, col_obj, col_ko = st.columns(3)
+        with col_size: team_size = st.radio("選出数", TEAM_SIZE_CHOICES, horizontal=True, key="team_size")
+        with col_obj: objective = st.selectbox("評価基準", TEAM_OBJECTIVE_CHOICES, key="team_objective")
+        with col_ko: ko_hits = st.number_input("KO とみなす確定発数 (以内)", min_value=1, max_value=10, value=2, step=1, key="team_ko_hits")
+
+        col_w_cov, col_w_ohko, col_power, col_workers = st.columns(4)
+        with col_w_cov: w_cov = st.number_input("重み: KO できる仮想敵 1体", min_value=0.0, value=1.0, step=0.5, key="team_w_cov")
+        with col_w_ohko: w_ohko = st.number_input("重み: 確定1発で倒される 1回", min_value=0.0, value=1.0, step=0.5, key="team_w_ohko")
+        with col_power: default_power = st.number_input("技セットがない場合の技威力", min_value=1, value=80, step=1, key="team_default_power")
+        with col_workers: workers = st.number_input("並列プロセス数", min_value=1, max_value=os.cpu_count() or 1, value=1, step=1, key="team_workers")
+
+        col_att_ev, col_h_ev, col_def_ev = st.columns(3)
+        with col_att_ev: att_ev = st.number_input("全員の A/C 努力値", min_value=0, max_value=252, value=252, step=4, key="team_att_ev")
+        with col_h_ev: h_ev = st.number_input("全員の H 努力値", min_value=0, max_value=252, value=0, step=4, key="team_h_ev")
+        with col_def_ev: def_ev = st.number_input("全員の B/D 努力値", min_value=0, max_value=252, value=0, step=4, key="team_def_ev")
+
+        submitted = st.form_submit_button("最適なチームを探索")
+
+    if not submitted:
+        return
+    if not threat_indices:
+        st.error("仮想敵を1体以上選択してください。")
+        return
+    # 仮想敵を自分のチームに入れると自分自身を KO できる扱いになるため、候補から除く
+    threat_set = set(threat_indices)
+    members = [p for i, p in enumerate(pokemons) if i not in threat_set]
+    if not members:
+        st.error("選出候補が残っていません。仮想敵にしないマイポケモンを1体以上残してください。")
+        return
+
+    threats = [pokemons[i] for i in threat_indices]
+    start = time.perf_counter()
+    offense, defense = team_pairwise_hits(
+        members, threats, {'A': att_ev, 'C': att_ev}, {'H': h_ev, 'B': def_ev, 'D': def_ev}, default_power
+    )
+    matrix_elapsed = time.perf_counter() - start
+    team, score, nodes = optimize_team(offense, defense, team_size, objective, ko_hits, (w_cov, w_ohko), int(workers))
+    search_elapsed = time.perf_counter() - start - matrix_elapsed
+
+    st.caption(f"ダメージ行列 {len(members)}×{len(threats)}: {matrix_elapsed:.2f} 秒 / 探索 {nodes:,} ノード: {search_elapsed:.2f} 秒")
+
+    covered = (offense[team] > 0) & (offense[team] <= ko_hits)
+    st.success(f"選出: **{' / '.join(members[i]['name'] for i in team)}** "
+               f"(KO できる仮想敵 {int(covered.any(axis=0).sum())}/{len(threats)} 体, "
+               f"確定1発で倒される回数 {int((defense[:, team] == 1).sum())})")
+    st.dataframe(pd.DataFrame([
+        {
+            'メンバー': members[i]['name'],
+            f'確定{ko_hits}発以内で倒せる仮想敵': ", ".join(threats[j]['name'] for j in np.flatnonzero(covered[row])),
+            '確定1発で倒してくる仮想敵': ", ".join(threats[j]['name'] for j in np.flatnonzero(defense[:, i] == 1)),
+        }
+        for row, i in enumerate(team)
+    ]), use_container_width=True)
+    uncovered = np.flatnonzero(~covered.any(axis=0))
+    if len(uncovered):
+        st.caption("KO できない仮想敵: " + ", ".join(threats[j]['name'] for j in uncovered))
+
+# --- 7.10 ZA補正係数フィッティング (実測ダメージから分子/4096を探索) ---
+ZA_FIT_DENOMINATOR = 4096
+ZA_FIT_REQUIRED_COLUMNS = ('level', 'power', 'attack', 'defense', 'damage')
+# 1回に評価する (観測数 × 候補数) の上限。観測が多い場合は候補を分割して処理し、メモリ量を抑える
+ZA_FIT_CHUNK_CELLS = 4_000_000
+ZA_FIT_DISPLAY_ROWS = 50
+ZA_FIT_LABELS = {
+    'context': "状況", 'numerator': "分子 (/4096)", 'ratio': "補正係数", 'n_obs': "観測数",
+    'consistent': "一致数", 'inconsistent': "不一致数",
+    'abs_residual_sum': "残差合計 (絶対値)", 'abs_residual_max': "最大残差", 'residual_mean': "平均残差 (符号付き)",
+}
+# 列: レベル, 威力, 攻撃実数値, 防御実数値, 補正倍率 (ZA補正を除く・省略時1.0), 実測ダメージ, 状況 (省略可)
+ZA_FIT_SAMPLE_CSV = """level,power,attack,defense,modifier,damage,context
+70,80,191,92,1.0,67,通常
+50,90,239,94,0.5,30,レイド
+50,60,201,187,1.0,18,通常
+50,120,198,95,0.5,33,レイド
+60,120,105,181,1.0,23,通常
+50,120,124,154,2.25,60,レイド
+50,120,168,126,1.0,45,通常
+70,60,230,96,0.5,25,レイド
+60,100,226,189,2.0,82,通常
+100,90,166,143,1.5,90,レイド
+60,60,237,156,0.5,16,通常
+70,100,163,98,1.0,67,レイド
+"""
+
+
+def load_damage_observations(text):
+    """
+    CSV テキストから実測ダメージのデータセットを読み込み、(観測テーブル, [(行番号, エラー)]) を返す。
+    modifier 列 (省略時 1.0) と context 列 (省略時 "全体") は任意。不正な行はスキップする。
+    """
+    # 空行も1行として読み、エラーの行番号をファイル上の行番号と一致させる (ヘッダー前の空行は読み飛ばす)
+    body = text.lstrip()
+    header_line = text[:len(text) - len(body)].count("\n") + 1
+    try:
+        raw = pd.read_csv(io.StringIO(body), dtype=str, skipinitialspace=True, skip_blank_lines=False)
+    except (pd.errors.EmptyDataError, pd.errors.ParserError) as e:
+        return None, [(header_line, f"CSVとして読み込めません: {e}")]
+    raw.columns = [str(c).strip() for c in raw.columns]
+    missing = [c for c in ZA_FIT_REQUIRED_COLUMNS if c not in raw.columns]
+    if missing:
+        return None, [(header_line, f"必須列がありません: {', '.join(missing)}")]
+    raw.index = raw.index + header_line + 1
+    raw = raw.dropna(how='all')
+
+    frame = pd.DataFrame({c: pd.to_numeric(raw[c], errors='coerce') for c in ZA_FIT_REQUIRED_COLUMNS})
+    frame['modifier'] = pd.to_numeric(raw['modifier'].fillna("1.0"), errors='coerce') if 'modifier' in raw.columns else 1.0
+    context = raw['context'].fillna("").str.strip() if 'context' in raw.columns else pd.Series("", index=raw.index)
+    frame['context'] = context.where(context != "", "全体")
+
+    integer_columns = list(ZA_FIT_REQUIRED_COLUMNS)
+    valid = frame[integer_columns].notna().all(axis=1) & frame['modifier'].notna()
+    valid &= (frame[integer_columns].fillna(0) % 1 == 0).all(axis=1)
+    valid &= (frame[['level', 'power', 'attack', 'defense']] > 0).all(axis=1) & (frame['damage'] >= 0) & (frame['modifier'] > 0)
+    errors = [(int(line), "数値が不正です (level/power/attack/defense は正の整数、damage は0以上の整数)") for line in frame.index[~valid]]
+
+    frame = frame[valid].reset_index(drop=True)
+    frame[integer_columns] = frame[integer_columns].astype(np.int64)
+    frame['context'] = pd.Categorical(frame['context'])
+    return frame, errors
+
+
+def fit_za_correction_ratio(observations, numerators=range(1, ZA_FIT_DENOMINATOR + 1), by_context=False):
+    """
+    全観測 × 全候補分子を一括で評価し、候補ごとの一致数と残差のテーブルを返す。
+    観測ダメージが [floor(最大 × 0.85), 最大] (最大 = ZA補正前ダメージ × 分子/4096 の切り捨て) に入れば一致、
+    外れた場合は近い方の端からの差を残差とする。by_context=True なら状況 (context) ごとに集計する。
+    """
+    numerators = np.asarray(numerators, dtype=np.int64)
+    columns = {c: observations[c].to_numpy() for c in ('level', 'power', 'attack', 'defense', 'modifier')}
+    pre_za = calculate_damage_base_np(columns['level'], columns['power'], columns['attack'],
+                                      columns['defense'], columns['modifier'].astype(np.float64))
+    damage = observations['damage'].to_numpy(dtype=np.int64)[:, None]
+
+    if by_context:
+        contexts = observations['context'].astype('category')
+        group_names, codes = list(contexts.cat.categories), contexts.cat.codes.to_numpy()
+    else:
+        group_names, codes = ["全体"], np.zeros(len(observations), dtype=np.int64)
+    # 状況ごとの集計を行列積で行うための one-hot (状況 × 観測)
+    one_hot = (codes[None, :] == np.arange(len(group_names))[:, None]).astype(np.float64)
+    groups = [np.flatnonzero(codes == g) for g in range(len(group_names))]
+
+    shape = (len(group_names), len(numerators))
+    consistent, abs_sum, signed_sum, abs_max = (np.zeros(shape, dtype=np.int64) for _ in range(4))
+    chunk = max(1, ZA_FIT_CHUNK_CELLS // max(1, len(pre_za)))
+    for start in range(0, len(numerators), chunk):
+        cols = slice(start, start + chunk)
+        # 分子/4096 は2進数で正確に表せるので、整数演算の切り捨ては calculate_damage_base と一致する
+        za_max = pre_za[:, None] * numerators[None, cols] // ZA_FIT_DENOMINATOR
+        za_min = np.floor(za_max * 0.85).astype(np.int64)
+        residual = damage - np.clip(damage, za_min, za_max)
+        consistent[:, cols] = one_hot @ (residual == 0)
+        abs_sum[:, cols] = one_hot @ np.abs(residual)
+        signed_sum[:, cols] = one_hot @ residual
+        for g, rows in enumerate(groups):
+            if len(rows):
+                abs_max[g, cols] = np.abs(residual[rows]).max(axis=0)
+
+    n_obs = np.array([len(rows) for rows in groups], dtype=np.int64)[:, None]
+    result = pd.DataFrame({
+        'context': pd.Categorical(np.repeat(group_names, len(numerators)), categories=group_names),
+        'numerator': _compact_ints(np.tile(numerators, len(group_names))),
+        'ratio': np.tile(numerators / ZA_FIT_DENOMINATOR, len(group_names)),
+        'n_obs': _compact_ints(np.broadcast_to(n_obs, shape).ravel()),
+        'consistent': _compact_ints(consistent.ravel()),
+        'inconsistent': _compact_ints((n_obs - consistent).ravel()),
+        'abs_residual_sum': abs_sum.ravel(),
+        'abs_residual_max': _compact_ints(abs_max.ravel()),
+        'residual_mean': (signed_sum / np.maximum(n_obs, 1)).ravel(),
+    })
+    return result.sort_values(['context', 'consistent', 'abs_residual_sum', 'numerator'],
+                              ascending=[True, False, True, True], kind='stable').reset_index(drop=True)
+
+
+def consistent_numerator_ranges(fit, group):
+    """全観測と矛盾しない分子を連続区間 [(最小, 最大), ...] にまとめる"""
+    rows = fit[(fit['context'] == group) & (fit['inconsistent'] == 0)]
+    values = np.sort(rows['numerator'].to_numpy(dtype=np.int64))
+    if len(values) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(values) > 1)
+    starts = np.concatenate([[values[0]], values[breaks + 1]])
+    ends = np.concatenate([values[breaks], [values[-1]]])
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def run_za_fit_mode_st():
+    st.subheader("🔬 ZA補正係数フィッティング: 実測ダメージから分子/4096を推定")
+    st.caption(f"実測ダメージのデータセットを、分子の候補すべて (n/{ZA_FIT_DENOMINATOR}) と一括で照合します。"
+               f"現在の仮説は {round(ZA_CORRECTION_RATIO * ZA_FIT_DENOMINATOR)}/{ZA_FIT_DENOMINATOR} です。")
+    st.caption("CSVの列: level, power, attack (攻撃側実数値), defense (防御側実数値), modifier (ZA補正を除く補正倍率、省略時1.0), "
+               "damage (実測ダメージ), context (状況、省略可)")
+
+    with st.form("za_fit_form"):
+        uploaded = st.file_uploader("CSVファイルから読み込む", type=["csv", "txt"], key="za_fit_file")
+        pasted = st.text_area("または貼り付け", value=ZA_FIT_SAMPLE_CSV, height=200, key="za_fit_text")
+        col_lo, col_hi, col_ctx = st.columns(3)
+        with col_lo: num_lo = st.number_input("分子の下限", min_value=1, max_value=ZA_FIT_DENOMINATOR, value=1, step=1, key="za_fit_lo")
+        with col_hi: num_hi = st.number_input("分子の上限", min_value=1, max_value=ZA_FIT_DENOMINATOR, value=ZA_FIT_DENOMINATOR, step=1, key="za_fit_hi")
+        with col_ctx: by_context = st.checkbox("状況 (context) ごとに別の係数を推定", value=False, key="za_fit_by_context")
+        submitted = st.form_submit_button("フィッティングを実行")
+
+    if submitted:
+        text, decode_error = decode_uploaded_text(uploaded.getvalue()) if uploaded is not None else (pasted, None)
+        # 読めないファイルは CSV の読み込みエラーと同じく (行番号, エラー) で表示する
+        observations, errors = load_damage_observations(text) if decode_error is None else (None, [decode_error])
+        if errors:
+            st.warning(f"{len(errors)} 件のエラーがあります (該当行はスキップ)。")
+            st.dataframe(pd.DataFrame(errors, columns=['行', 'エラー']), use_container_width=True)
+        if observations is None or observations.empty:
+            st.error("有効な観測がありません。")
+            st.session_state['za_fit'] = None
+        elif num_lo > num_hi:
+            st.error("分子の下限が上限を超えています。")
+            st.session_state['za_fit'] = None
+        else:
+            start = time.perf_counter()
+            fit = fit_za_correction_ratio(observations, range(num_lo, num_hi + 1), by_context)
+            elapsed = time.perf_counter() - start
+            st.session_state['za_fit'] = fit
+            st.caption(f"{len(observations):,} 件の観測 × {num_hi - num_lo + 1:,} 通りの分子を照合 ({elapsed * 1000:.1f} ms)")
+
+    fit = st.session_state.get('za_fit')
+    if fit is None:
+        return
+
+    current = round(ZA_CORRECTION_RATIO * ZA_FIT_DENOMINATOR)
+    for group in fit['context'].cat.categories:
+        rows = fit[fit['context'] == group]
+        best = rows.iloc[0]
+        ranges = consistent_numerator_ranges(fit, group)
+        st.markdown(f"#### {group} (観測 {best['n_obs']} 件)")
+        if ranges:
+            text = ", ".join(f"{lo}" if lo == hi else f"{lo}～{hi}" for lo, hi in ranges)
+            st.success(f"全観測と矛盾しない分子: **{text}** /{ZA_FIT_DENOMINATOR}")
+        else:
+            st.warning(f"全観測と一致する分子はありません。最も一致するのは **{best['numerator']}/{ZA_FIT_DENOMINATOR}** "
+                       f"({best['consistent']}/{best['n_obs']} 件一致)。補正倍率の入力漏れや状況の違いを確認してください。")
+        at_current = rows[rows['numerator'] == current]
+        if not at_current.empty:
+            st.caption(f"現在の仮説 {current}/{ZA_FIT_DENOMINATOR}: {at_current.iloc[0]['consistent']}/{best['n_obs']} 件一致")
+
+    chart = alt.Chart(fit[['context', 'numerator', 'consistent']]).mark_line().encode(
+        x=alt.X('numerator:Q', title=ZA_FIT_LABELS['numerator']),
+        y=alt.Y('consistent:Q', title=ZA_FIT_LABELS['consistent']),
+        color=alt.Color('context:N', title=ZA_FIT_LABELS['context']),
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+    st.caption(f"一致数の多い順 (状況ごとに上位 {ZA_FIT_DISPLAY_ROWS} 件)")
+    top = fit.groupby('context', observed=True, sort=False).head(ZA_FIT_DISPLAY_ROWS)
+    st.dataframe(top.rename(columns=ZA_FIT_LABELS), hide_index=True, use_container_width=True)
+    st.download_button("全候補の結果をCSVでダウンロード", data=fit.rename(columns=ZA_FIT_LABELS).to_csv(index=False).encode("utf-8-sig"),
+                       file_name="za_fit.csv", key="za_fit_download")
+
+# --- 7.11 確定数インデックス (実数値のソート配列に対する二分探索) ---
+# レベル・威力・補正倍率を固定すると、ダメージは攻撃実数値について単調増加、防御実数値について単調減少する。
+# そのため「倒せる/耐える」境界の実数値を二分探索で求め、ソート済みの実数値配列から該当範囲を切り出せる。
+ROSTER_INDEX_STATS = ('H', 'A', 'B', 'C', 'D')
+ROSTER_INDEX_DISPLAY_ROWS = 200
+
+
+def build_roster_stat_index(pokemons, level, att_ev, def_ev, h_ev):
+    """
+    マイポケモン全体の実数値 (個体値の最小/最大) を固定レベル・努力値で計算し、能力ごとにソートしたインデックスを作る。
+    努力値は A/C に att_ev、B/D に def_ev、H に h_ev を全員一律で振る (性格・能力変化は補正なし)。
+    """
+    index = {'level': level, 'ids': tuple(p['id'] for p in pokemons), 'names': [p['name'] for p in pokemons]}
+    for stat in ROSTER_INDEX_STATS:
+        base = np.array([p[f'{stat}_base'] for p in pokemons], dtype=np.int64)
+        ivs = np.array([get_iv_range(p[f'{stat}_iv']) for p in pokemons], dtype=np.int64).reshape(-1, 2)
+        ev = h_ev if stat == 'H' else (att_ev if stat in ('A', 'C') else def_ev)
+        for bound, iv in (('min', ivs[:, 0]), ('max', ivs[:, 1])):
+            column = f'{stat}_{bound}'
+            if stat == 'H':
+                values = calculate_hp_value_np(base, iv, ev, level)
+                # HP は防御側の境界を HP ごとに求めるため、重複を除いた値と逆引きを持つ
+                index[f'{column}_unique'], index[f'{column}_inverse'] = np.unique(values, return_inverse=True)
             else:
-                # 3体攻撃 vs 1体防御
-                
-                # 攻撃 (仮想敵) 実数値 vs 防御 MIN (TTK計算はHP MAXを使用)
-                za_range_min, za_ttk_min = perform_damage_calc(
-                    level, power_i, enemy['stat'], def_min, def_hp_max, final_correction_ratio
-                )
-                # 攻撃 (仮想敵) 実数値 vs 防御 MAX (TTK計算はHP MINを使用)
-                za_range_max, za_ttk_max = perform_damage_calc(
-                    level, power_i, enemy['stat'], def_max, def_hp_min, final_correction_ratio
-                )
-                
-                results.append({
-                    '攻撃側': enemy['name'],
-                    '技威力': power_i,
-                    f'{att_stat_name}実数値': enemy['stat'],
-                    'タイプ相性': enemy['type_mod_name'],
-                    f'ZAダメ幅 (防{def_stat_key} MIN / HP MAX)': za_range_min, 
-                    f'ZA TTK (防{def_stat_key} MIN / HP MAX)': za_ttk_min,     
-                    f'ZAダメ幅 (防{def_stat_key} MAX / HP MIN)': za_range_max, 
-                    f'ZA TTK (防{def_stat_key} MAX / HP MIN)': za_ttk_max,     
-                })
-                
-        df = pd.DataFrame(results)
-        st.dataframe(df, use_container_width=True)
+                values = calculate_stat_value_np(base, iv, ev, level, 1.0, 1.0)
+            order = np.argsort(values, kind='stable')
+            index[column], index[f'{column}_order'], index[f'{column}_sorted'] = values, order, values[order]
+    return index
+
+
+def get_roster_stat_index(pokemons, level, att_ev, def_ev, h_ev):
+    """セッション内で同じマイポケモン構成・設定のインデックスを使い回す"""
+    key = (tuple(p['id'] for p in pokemons), level, att_ev, def_ev, h_ev)
+    cached = st.session_state.get('roster_stat_index')
+    if cached is None or cached[0] != key:
+        cached = (key, build_roster_stat_index(pokemons, level, att_ev, def_ev, h_ev))
+        st.session_state['roster_stat_index'] = cached
+    return cached[1]
+
+
+def _bisect_first_true(lo, hi, predicate):
+    """lo..hi で predicate (単調) が初めて True になる整数を返す。hi でも False なら None"""
+    if not predicate(hi):
+        return None
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if predicate(mid):
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+def _bisect_first_true_np(lo, hi, predicate):
+    """_bisect_first_true の配列版 (要素ごとに同時に二分探索する)。hi でも False の要素は 0"""
+    lo, hi = np.array(lo, dtype=np.int64), np.array(hi, dtype=np.int64)
+    found = predicate(hi)
+    while np.any(lo < hi):
+        mid = (lo + hi) // 2
+        ok = predicate(mid)
+        hi = np.where(ok, mid, hi)
+        lo = np.where(ok, lo, mid + 1)
+    return np.where(found, lo, 0)
 
 
+def _za_damage_np(level, power, attack, defense, ratio, roll):
+    """乱数最大 ('max') または最小 ('min') の ZA ダメージ (配列)"""
+    damage = calculate_damage_base_np(level, power, attack, defense, ratio, is_za=True)
+    return damage if roll == 'max' else np.floor(damage * 0.85).astype(np.int64)
+
+
+def min_ko_attack(level, power, defense, hp, ratio, hits=1, guaranteed=True, max_attack=None):
+    """
+    防御実数値 defense・HP hp の相手を hits 発以内で倒せる最小の攻撃実数値を返す (max_attack 以下で届かなければ None)。
+    guaranteed=True なら乱数最小でも倒せる (確定)、False なら乱数最大なら倒せる (乱数) 境界。
+    """
+    if ratio <= 0:
+        return None
+    roll = 0 if guaranteed else 1
+    if max_attack is None:
+        # 各段階の切り捨て (最大1ずつ) を見込んでも乱数最小で hp に届く攻撃実数値 (威力・レベル項は1として見積もる)
+        max_attack = math.ceil(defense * (50 * (hp + 3) / (ratio * ZA_CORRECTION_RATIO * 0.85) + 1))
+    return _bisect_first_true(1, max_attack, lambda a: compute_damage_range(level, power, a, defense, ratio)[roll] * hits >= hp)
+
+
+def min_surviving_defense(level, power, attack, hp, ratio, hits=1, guaranteed=True, max_defense=None):
+    """
+    攻撃実数値 attack の攻撃を hits 発耐えられる最小の防御実数値を返す (max_defense 以下で耐えられなければ None)。
+    guaranteed=True なら乱数最大でも耐える (確定耐え)、False なら乱数最小なら耐える境界。
+    hp に配列を渡すと HP ごとの境界を配列で返す (耐えられない要素は 0)。
+    """
+    if max_defense is None:
+        # 防御実数値がこれを超えると base_calc_2 が0になり、ダメージはそれ以上減らない
+        max_defense = (int(level) * 2 // 5 + 2) * int(power) * int(attack) + 1
+    if np.ndim(hp) == 0:
+        roll = 1 if guaranteed else 0
+        return _bisect_first_true(1, max_defense, lambda d: compute_damage_range(level, power, attack, d, ratio)[roll] * hits < hp)
+    roll = 'max' if guaranteed else 'min'
+    hp = np.asarray(hp, dtype=np.int64)
+    return _bisect_first_true_np(np.ones_like(hp), np.full_like(hp, max_defense),
+                                 lambda d: _za_damage_np(level, power, attack, d, ratio, roll) * hits < hp)
+
+
+def query_ko_attackers(index, category, defense, hp, power, ratio, hits=1, guaranteed=True):
+    """
+    相手 (防御実数値・HP) を hits 発以内で倒せるマイポケモンを、攻撃実数値の高い順のインデックス配列で返す。
+    戻り値: (境界の攻撃実数値 または None, マイポケモンのインデックス配列)
+    """
+    column = f"{'A' if category == MOVE_CATEGORY_CHOICES[0] else 'C'}_{'min' if guaranteed else 'max'}"
+    sorted_values = index[f'{column}_sorted']
+    if len(sorted_values) == 0:
+        return None, np.empty(0, dtype=np.int64)
+    threshold = min_ko_attack(index['level'], power, defense, hp, ratio, hits, guaranteed, int(sorted_values[-1]))
+    if threshold is None:
+        return None, np.empty(0, dtype=np.int64)
+    start = np.searchsorted(sorted_values, threshold, side='left')
+    return threshold, index[f'{column}_order'][start:][::-1]
+
+
+def query_surviving_defenders(index, category, attack, power, ratio, hits=1, guaranteed=True):
+    """
+    攻撃実数値 attack の攻撃を hits 発耐えるマイポケモンを、防御実数値の高い順のインデックス配列で返す。
+    HP が異なると境界も異なるため、重複を除いた HP ごとに境界を二分探索で求めてから比較する。
+    戻り値: ({HP: 境界の防御実数値 (マイポケモンの最大防御でも耐えられなければ 0)}, マイポケモンのインデックス配列)
+    """
+    bound = 'min' if guaranteed else 'max'
+    column = f"{'B' if category == MOVE_CATEGORY_CHOICES[0] else 'D'}_{bound}"
+    sorted_values = index[f'{column}_sorted']
+    if len(sorted_values) == 0:
+        return {}, np.empty(0, dtype=np.int64)
+    hp_unique, hp_inverse = index[f'H_{bound}_unique'], index[f'H_{bound}_inverse']
+    # 境界がマイポケモンの最大防御を超える HP では誰も耐えないので、探索範囲をそこまでに絞る
+    thresholds = min_surviving_defense(index['level'], power, attack, hp_unique, ratio, hits, guaranteed,
+                                       max(1, int(sorted_values[-1])))
+    entry_thresholds = thresholds[hp_inverse]
+    survives = (entry_thresholds > 0) & (index[column] >= entry_thresholds)
+    order = index[f'{column}_order'][::-1]
+    return dict(zip(hp_unique.tolist(), thresholds.tolist())), order[survives[order]]
+
+
+def _roster_query_frame(index, indices, stat_columns):
+    """クエリ結果 (インデックス配列) の先頭 ROSTER_INDEX_DISPLAY_ROWS 件を表示用テーブルにする"""
+    shown = indices[:ROSTER_INDEX_DISPLAY_ROWS]
+    frame = pd.DataFrame({'No.': shown + 1, '名前': [index['names'][i] for i in shown]})
+    for label, column in stat_columns.items():
+        frame[label] = [f"{index[column + '_min'][i]}～{index[column + '_max'][i]}" for i in shown]
+    return frame
+
+
+def run_roster_index_mode_st():
+    st.subheader("🎯 確定数インデックス: 倒せる/耐えるマイポケモンの即時検索")
+    st.caption("マイポケモン全員の実数値を同じレベル・努力値で計算してソートしておき、境界の実数値を二分探索で求めます。")
+
+    pokemons = st.session_state.my_pokemons
+    if not pokemons:
+        st.warning("マイポケモンを登録してください。")
+        return
+
+    col_level, col_att_ev, col_h_ev, col_def_ev = st.columns(4)
+    with col_level: level = st.number_input("全員のレベル", min_value=1, max_value=100, value=50, step=1, key="ridx_level")
+    with col_att_ev: att_ev = st.number_input("全員の A/C 努力値", min_value=0, max_value=252, value=252, step=4, key="ridx_att_ev")
+    with col_h_ev: h_ev = st.number_input("全員の H 努力値", min_value=0, max_value=252, value=0, step=4, key="ridx_h_ev")
+    with col_def_ev: def_ev = st.number_input("全員の B/D 努力値", min_value=0, max_value=252, value=0, step=4, key="ridx_def_ev")
+
+    start = time.perf_counter()
+    index = get_roster_stat_index(pokemons, level, att_ev, def_ev, h_ev)
+    index_elapsed = time.perf_counter() - start
+
+    col_cat, col_power, col_ratio, col_hits, col_guaranteed = st.columns(5)
+    with col_cat: category = st.radio("技の分類", MOVE_CATEGORY_CHOICES, horizontal=True, key="ridx_category")
+    with col_power: power = st.number_input("技の威力", min_value=1, value=100, step=1, key="ridx_power")
+    with col_ratio: ratio = st.number_input("補正倍率 (ZA補正を除く)", min_value=0.1, value=1.0, step=0.25, key="ridx_ratio")
+    with col_hits: hits = st.number_input("発数 (以内)", min_value=1, max_value=10, value=1, step=1, key="ridx_hits")
+    with col_guaranteed: guaranteed = st.checkbox("確定のみ (乱数・個体値の最悪ケース)", value=True, key="ridx_guaranteed")
+    att_label, def_label = ("攻撃", "防御") if category == MOVE_CATEGORY_CHOICES[0] else ("特攻", "特防")
+    att_column, def_column = ('A', 'B') if category == MOVE_CATEGORY_CHOICES[0] else ('C', 'D')
+
+    tab_ko, tab_survive = st.tabs([f"この相手を{hits}発以内で倒せるマイポケモン", f"この攻撃を{hits}発耐えるマイポケモン"])
+    with tab_ko:
+        col_def, col_hp = st.columns(2)
+        with col_def: defense = st.number_input(f"相手の{def_label}実数値", min_value=1, value=120, step=1, key="ridx_target_def")
+        with col_hp: hp = st.number_input("相手のHP実数値", min_value=1, value=180, step=1, key="ridx_target_hp")
+        start = time.perf_counter()
+        threshold, indices = query_ko_attackers(index, category, defense, hp, power, ratio, hits, guaranteed)
+        elapsed = time.perf_counter() - start
+        if threshold is None:
+            st.info(f"{hits}発以内で倒せるマイポケモンはいません。")
+        else:
+            st.success(f"{att_label}実数値 **{threshold}** 以上で倒せます → **{len(indices)}体** / {len(pokemons)}体")
+            st.dataframe(_roster_query_frame(index, indices, {att_label: att_column}), hide_index=True, use_container_width=True)
+        st.caption(f"検索 {elapsed * 1e6:,.0f} µs (インデックス準備 {index_elapsed * 1000:.2f} ms)")
+
+    with tab_survive:
+        attack = st.number_input(f"相手の{att_label}実数値", min_value=1, value=180, step=1, key="ridx_source_att")
+        start = time.perf_counter()
+        thresholds, indices = query_surviving_defenders(index, category, attack, power, ratio, hits, guaranteed)
+        elapsed = time.perf_counter() - start
+        st.success(f"{hits}発耐えるマイポケモン: **{len(indices)}体** / {len(pokemons)}体")
+        st.dataframe(_roster_query_frame(index, indices, {'HP': 'H', def_label: def_column}), hide_index=True, use_container_width=True)
+        st.caption(f"検索 {elapsed * 1e6:,.0f} µs (インデックス準備 {index_elapsed * 1000:.2f} ms)")
+
+        hp_for_threshold = st.number_input("HP実数値を指定して必要な防御を確認", min_value=1, value=180, step=1, key="ridx_survive_hp")
+        needed = min_surviving_defense(level, power, attack, hp_for_threshold, ratio, hits, guaranteed)
+        if needed is None:
+            st.info(f"HP {hp_for_threshold} では{def_label}をいくら上げても耐えられません。")
+        else:
+            st.write(f"HP {hp_for_threshold} なら {def_label}実数値 **{needed}** 以上で耐えます。")
+
+# --- 7.12 1対1 勝率ソルバー (素早さ順 + 乱数16段階の厳密計算) ---
+# 受けるダメージは自分の残りHPに依存しないため、(自分のHP, 相手のHP) のマルコフ連鎖は
+# 「相手を倒すまでの発数 N」の分布2つに分解できる。先に動く側は N_自分 <= N_相手 なら勝ち、
+# 後に動く側は N_自分 < N_相手 なら勝ち、同速は毎ターン1/2で行動順が決まるため N が等しい場合だけ五分になる。
+DUEL_IV_BOUND_CHOICES = ("個体値の最大値", "個体値の最小値")
+DUEL_MAX_TURNS = 50  # 乱数最小が0ダメージの技などで決着しない場合に打ち切るターン数 (残りは引き分け扱い)
+DUEL_LABELS = {
+    'member': "マイポケモン", 'threat': "仮想敵", 'member_move': "使う技", 'threat_move': "相手の技",
+    'speed_order': "行動順", 'win': "勝率", 'lose': "負け率", 'draw': "決着なし",
+}
+DUEL_SPEED_ORDER_LABELS = {1: "先攻", 0: "同速", -1: "後攻"}
+
+
+def duel_profiles(pokemons, ev, iv_bound, default_power=80, tech_plus_mod=1.0):
+    """
+    対戦する全ポケモンの実数値 (IV は iv_bound 側の値) と技セットを配列にまとめる。
+    技セットを持たないポケモンは汎用技 (_generic_move) を使う。技は MAX_MOVES 枠に詰め、空き枠は威力0。
+    """
+    bound = 'max' if iv_bound == DUEL_IV_BOUND_CHOICES[0] else 'min'
+    att_ev = {s: ev.get(s, 0) for s in ('A', 'C', 'S')}
+    def_ev = {s: ev.get(s, 0) for s in ('H', 'B', 'D')}
+    n = len(pokemons)
+    profiles = {
+        'names': [p['name'] for p in pokemons],
+        'level': np.array([p['level'] for p in pokemons], dtype=np.int64),
+        'move_names': [],
+        'power': np.zeros((n, MAX_MOVES), dtype=np.int64),
+        'is_physical': np.ones((n, MAX_MOVES), dtype=bool),
+        'ratio': np.ones((n, MAX_MOVES), dtype=np.float64),
+    }
+    for stat in STAT_KEYS:
+        profiles[stat] = np.zeros(n, dtype=np.int64)
+    for i, p in enumerate(pokemons):
+        # 攻撃側の役割で A/C/S、防御側の役割で H/B/D を計算する (S はどちらの役割でも制限されない)
+        att_stats = get_stats_from_settings(p, att_ev, {}, {}, p['level'], True)
+        def_stats = get_stats_from_settings(p, def_ev, {}, {}, p['level'], False)
+        for stat in STAT_KEYS:
+            profiles[stat][i] = (def_stats if stat in def_ev else att_stats)[f'{stat}_{bound}']
+        moves = list(p.get('moves') or [_generic_move(p, default_power)])[:MAX_MOVES]
+        moveset = prepare_moveset(moves, tech_plus_mod)
+        k = len(moves)
+        profiles['move_names'].append(moveset['names'])
+        profiles['power'][i, :k] = moveset['power']
+        profiles['is_physical'][i, :k] = moveset['is_physical']
+        profiles['ratio'][i, :k] = moveset['ratio']
+    return profiles
+
+
+def duel_damage_tables(attackers, defenders):
+    """
+    攻撃側 × 防御側 の全組について最大ダメージの技を選び、その技の乱数16段階のダメージ表を返す。
+    戻り値: (技インデックス[攻, 防], ダメージ表[攻, 防, 16], 防御側HP[防])
+    """
+    phys = attackers['is_physical'][:, None, :]
+    attack = np.where(phys, attackers['A'][:, None, None], attackers['C'][:, None, None])
+    defense = np.where(phys, defenders['B'][None, :, None], defenders['D'][None, :, None])
+    dmg_max = calculate_damage_base_np(attackers['level'][:, None, None], attackers['power'][:, None, :],
+                                       attack, defense, attackers['ratio'][:, None, :], is_za=True)
+    dmg_max = np.where(attackers['power'][:, None, :] > 0, dmg_max, -1)  # 空き枠は選ばない
+    best = np.argmax(dmg_max, axis=2)
+    best_max = np.maximum(np.take_along_axis(dmg_max, best[:, :, None], axis=2), 0)
+    # raid_damage_table と同じく floor(最大ダメージ × 乱数% / 100)
+    tables = np.floor(best_max * np.array(RAID_DAMAGE_ROLLS) / 100).astype(np.int64)
+    return best, tables, defenders['H']
+
+
+def hits_to_ko_cdf(tables, hp, max_hits=DUEL_MAX_TURNS):
+    """
+    乱数16段階のダメージ表 (組, 16) と HP (組,) から、k 発以内に倒す確率 P(N <= k) を (組, max_hits + 1) で返す。
+    乱数最大で倒せる発数より前は0、乱数最小で倒せる発数以降は1なので、その間だけを厳密に畳み込む。
+    k 発後の累積ダメージは [k × 最小, k × 最大] に収まるため、分布は「k × 最小」からの差分 (幅 k × (最大 - 最小) + 1) で持つ。
+    """
+    tables = np.asarray(tables, dtype=np.int64)
+    hp = np.asarray(hp, dtype=np.int64)
+    never = max_hits + 1
+    roll_min, roll_max = tables.min(axis=1), tables.max(axis=1)
+    first_possible = np.where(roll_max > 0, -(-hp // np.maximum(roll_max, 1)), never)
+    guaranteed = np.where(roll_min > 0, -(-hp // np.maximum(roll_min, 1)), never)
+    cdf = (np.arange(max_hits + 1)[None, :] >= guaranteed[:, None]).astype(np.float64)
+
+    # 発数が乱数で変わり、かつ max_hits 以内に倒す可能性がある組だけを畳み込む
+    active = np.flatnonzero((first_possible < guaranteed) & (first_possible <= max_hits))
+    if len(active) == 0:
+        return cdf
+    shifts = tables[active] - roll_min[active, None]  # 乱数ごとの「最小からの上乗せ」
+    roll_min, hp, guaranteed = roll_min[active], hp[active], guaranteed[active]
+    roll_weight = 1.0 / tables.shape[1]
+    dist = np.ones((len(active), 1))
+    knocked_out = np.zeros(len(active))
+    for k in range(1, min(int(guaranteed.max()), never)):
+        m, width = dist.shape
+        new_width = width + int(shifts.max())
+        # 差分座標で remaining 以上なら倒れている (remaining が配列の外なら、この発では倒れない)
+        remaining = hp - k * roll_min
+        absorb = np.minimum(remaining, new_width)
+        offsets = (np.arange(m) * (new_width + 1))[:, None]
+        positions = np.arange(width)[None, :]
+        alive = (dist * roll_weight).ravel()
+        nxt = np.zeros(m * (new_width + 1))
+        for j in range(shifts.shape[1]):
+            target = np.minimum(positions + shifts[:, j:j + 1], absorb[:, None])
+            nxt += np.bincount((offsets + target).ravel(), weights=alive, minlength=m * (new_width + 1))
+        nxt = nxt.reshape(m, new_width + 1)
+        rows = np.arange(m)
+        knocked_out = knocked_out + nxt[rows, absorb]
+        nxt[rows, absorb] = 0.0
+        cdf[active, k] = knocked_out
+        # 次の発で確定する組は以降1なので外し、残りの組の到達しうる幅まで詰める
+        keep = guaranteed > k + 1
+        if not keep.any():
+            break
+        active, shifts, roll_min, hp, guaranteed, knocked_out = (
+            active[keep], shifts[keep], roll_min[keep], hp[keep], guaranteed[keep], knocked_out[keep])
+        dist = nxt[keep, :min(new_width, int((hp - k * roll_min).max()))]
+    return cdf
+
+
+def duel_outcome(cdf_a, cdf_b, speed_order):
+    """
+    両者の「k 発以内に倒す確率」と行動順 (1: a が先攻, 0: 同速, -1: a が後攻) から (a の勝率, 負け率, 決着なし) を返す。
+    """
+    pmf_a = np.diff(cdf_a, axis=1)  # P(N_a = k), k = 1..K
+    survive_b = 1.0 - cdf_b  # P(N_b > k), k = 0..K
+    a_first = (pmf_a * survive_b[:, :-1]).sum(axis=1)  # P(N_a <= N_b)
+    a_second = (pmf_a * survive_b[:, 1:]).sum(axis=1)  # P(N_a < N_b)
+    win = np.where(speed_order > 0, a_first, np.where(speed_order < 0, a_second, (a_first + a_second) / 2))
+    draw = (1.0 - cdf_a[:, -1]) * (1.0 - cdf_b[:, -1])
+    return win, np.clip(1.0 - win - draw, 0.0, 1.0), draw
+
+
+@persistent_cache
+def solve_duels(members, threats, ev, iv_bound=DUEL_IV_BOUND_CHOICES[0], default_power=80, tech_plus_mod=1.0):
+    """
+    マイポケモン × 仮想敵 の全組の1対1の勝率を厳密に求める。両者とも毎ターン相手に最大ダメージの技を使い、
+    素早さが高い方が先に行動する (同速は毎ターン1/2)。命中率・急所・追加効果は考慮しない。
+    戻り値は1組1行の DataFrame (使う技、行動順、勝率/負け率/決着なし)。
+    """
+    a = duel_profiles(members, ev, iv_bound, default_power, tech_plus_mod)
+    b = duel_profiles(threats, ev, iv_bound, default_power, tech_plus_mod)
+    move_a, tables_a, _ = duel_damage_tables(a, b)
+    move_b, tables_b, _ = duel_damage_tables(b, a)
+
+    n, m = len(members), len(threats)
+    hp_b = np.broadcast_to(b['H'][None, :], (n, m)).ravel()
+    hp_a = np.broadcast_to(a['H'][:, None], (n, m)).ravel()
+    cdf_a = hits_to_ko_cdf(tables_a.reshape(n * m, -1), hp_b)
+    cdf_b = hits_to_ko_cdf(tables_b.transpose(1, 0, 2).reshape(n * m, -1), hp_a)
+    speed_order = np.sign(a['S'][:, None] - b['S'][None, :]).ravel()
+    win, lose, draw = duel_outcome(cdf_a, cdf_b, speed_order)
+
+    rows, cols = np.divmod(np.arange(n * m), m)
+    return pd.DataFrame({
+        'member': pd.Categorical([a['names'][i] for i in rows]),
+        'threat': pd.Categorical([b['names'][j] for j in cols]),
+        'member_move': pd.Categorical([a['move_names'][i][k] for i, k in zip(rows, move_a.ravel())]),
+        'threat_move': pd.Categorical([b['move_names'][j][k] for j, k in zip(cols, move_b.T.ravel())]),
+        'speed_order': speed_order.astype(np.int8),
+        'win': win,
+        'lose': lose,
+        'draw': draw,
+    })
+
+
+def format_duel_rows(frame):
+    """勝率テーブルの表示用 (確率は%、行動順は文字列)"""
+    display = frame.copy()
+    display['speed_order'] = display['speed_order'].map(DUEL_SPEED_ORDER_LABELS)
+    for column in ('win', 'lose', 'draw'):
+        display[column] = (display[column] * 100).round(2)
+    return display.rename(columns=DUEL_LABELS)
+
+
+def run_duel_mode_st():
+    st.subheader("⚖️ 1対1 勝率: 素早さと乱数を考慮したタイマンの厳密な勝率")
+    st.caption("両者とも毎ターン最大ダメージの技を使い、素早さが高い方が先に行動します (同速は毎ターン1/2)。"
+               "乱数16段階をすべて数え上げた勝率です。命中率・急所・追加効果は考慮しません。")
+
+    pokemons = st.session_state.my_pokemons
+    if not pokemons:
+        st.warning("マイポケモンを登録してください。")
+        return
+
+    with st.form("duel_form"):
+        col_members, col_threats = st.columns(2)
+        with col_members:
+            member_indices = st.multiselect("マイポケモン", options=range(len(pokemons)), default=list(range(len(pokemons))),
+                                            format_func=lambda i: pokemons[i]['name'], key="duel_members")
+        with col_threats:
+            threat_indices = st.multiselect("仮想敵 (マイポケモンから選択)", options=range(len(pokemons)), default=list(range(len(pokemons))),
+                                            format_func=lambda i: pokemons[i]['name'], key="duel_threats")
+        ev_cols = st.columns(len(STAT_KEYS))
+        ev = {}
+        for col, stat in zip(ev_cols, STAT_KEYS):
+            with col:
+                ev[stat] = st.number_input(f"全員の {stat} 努力値", min_value=0, max_value=252,
+                                           value=252 if stat in ('A', 'C', 'S') else 0, step=4, key=f"duel_ev_{stat}")
+        col_iv, col_power, col_tech = st.columns(3)
+        with col_iv: iv_bound = st.radio("個体値", DUEL_IV_BOUND_CHOICES, horizontal=True, key="duel_iv_bound")
+        with col_power: default_power = st.number_input("技セットがない場合の技威力", min_value=1, value=80, step=1, key="duel_default_power")
+        with col_tech: tech_plus_mod = TECHNIQUE_PLUS_MODIFIERS[st.selectbox("技プラス補正 (対象技のみ)", options=TECHNIQUE_PLUS_CHOICES, index=0, key="duel_tech")]
+        submitted = st.form_submit_button("勝率を計算")
+
+    if submitted:
+        if not member_indices or not threat_indices:
+            st.error("マイポケモンと仮想敵をそれぞれ1体以上選択してください。")
+            return
+        start = time.perf_counter()
+        st.session_state['duel_results'] = solve_duels(
+            [pokemons[i] for i in member_indices], [pokemons[i] for i in threat_indices],
+            ev, iv_bound, default_power, tech_plus_mod,
+        )
+        elapsed = time.perf_counter() - start
+        n_duels = len(st.session_state['duel_results'])
+        st.caption(f"{n_duels:,} 組を {elapsed * 1000:.1f} ms で計算 ({n_duels / max(elapsed, 1e-9):,.0f} 組/秒)")
+
+    results = st.session_state.get('duel_results')
+    if results is None:
+        return
+
+    heatmap = alt.Chart(results).mark_rect().encode(
+        x=alt.X('threat:N', title=DUEL_LABELS['threat']),
+        y=alt.Y('member:N', title=DUEL_LABELS['member']),
+        color=alt.Color('win:Q', title=DUEL_LABELS['win'], scale=alt.Scale(domain=[0, 1], scheme='redblue')),
+        tooltip=[alt.Tooltip('member', title=DUEL_LABELS['member']), alt.Tooltip('threat', title=DUEL_LABELS['threat']),
+                 alt.Tooltip('member_move', title=DUEL_LABELS['member_move']), alt.Tooltip('threat_move', title=DUEL_LABELS['threat_move']),
+                 alt.Tooltip('win', title=DUEL_LABELS['win'], format='.1%')],
+    )
+    st.altair_chart(heatmap, use_container_width=True)
+
+    results = results.sort_values('win', ascending=False, kind='stable')
+    st.dataframe(format_duel_rows(results.head(RESULT_DISPLAY_PAGE_SIZE)), hide_index=True, use_container_width=True)
+    if len(results) > RESULT_DISPLAY_PAGE_SIZE:
+        st.caption(f"勝率の高い順に上位 {RESULT_DISPLAY_PAGE_SIZE} 組を表示 (全 {len(results):,} 組)")
+
 # --- 8. メイン実行関数 ---
 def main_st():
     st.set_page_config(page_title="ポケモンダメージ計算機 (ZA補正対応)", layout="wide")
@@ -967,9 +3267,9 @@ def main_st():
     # サイドバーに登録済みポケモンリストを表示 (どのモードでも表示)
     display_pokemon_list()
     
-    # メインのモード選択 (順番: 簡単、詳細、シミュレーション)
+    # メインのモード選択 (順番: 簡単、詳細、シミュレーション、技セット、スイープ、補正組み合わせ、チーム選出、レイド、ZA補正フィッティング、確定数インデックス、1対1勝率)
     selected_mode = st.radio("計算モードを選択", 
-                            ["簡単モード", "詳細モード", "対戦シミュレーションモード"], 
+                            ["簡単モード", "詳細モード", "対戦シミュレーションモード", "技セット比較モード", "育成スイープモード", "補正組み合わせスイープ", "チーム選出最適化", "レイドシミュレーションモード", "ZA補正係数フィッティング", "確定数インデックス", "1対1勝率"], 
                             horizontal=True, key="main_mode_select") 
     
     # 選択された名前に応じて、元の関数を呼び出す
@@ -979,18 +3279,38 @@ def main_st():
         run_detailed_mode_st() # 種族値/EV入力
     elif selected_mode == "対戦シミュレーションモード":
         run_battle_sim_mode_st()
+    elif selected_mode == "技セット比較モード":
+        run_moveset_mode_st()
+    elif selected_mode == "育成スイープモード":
+        run_sweep_mode_st()
+    elif selected_mode == "補正組み合わせスイープ":
+        run_modifier_sweep_mode_st()
+    elif selected_mode == "チーム選出最適化":
+        run_team_optimizer_mode_st()
+    elif selected_mode == "レイドシミュレーションモード":
+        run_raid_sim_mode_st()
+    elif selected_mode == "ZA補正係数フィッティング":
+        run_za_fit_mode_st()
+    elif selected_mode == "確定数インデックス":
+        run_roster_index_mode_st()
+    elif selected_mode == "1対1勝率":
+        run_duel_mode_st()
     
     # ポケモン登録フォーム
     st.markdown("---")
     st.header("マイポケモン管理")
     register_pokemon_form()
+    team_import_export_form()
+
+    # 計算結果キャッシュの状態 (このリランで保存した結果も含めるため、各モードの実行後に表示)
+    display_result_cache_status()
     
     st.markdown("""
     ---
     ### 補足情報
     * **表示される結果について**: 「詳細モード」では、**設定した個体値の最小値から最大値までのブレを全て考慮したダメージ幅**を、単一の結果として表示します。
     * **TTK (Time To Knockout)**: ダメージ乱数最小/最大に基づき、敵HPを倒すのに必要な最小発数〜最大発数を示します。TTK計算には、防御側の設定個体値の**最大値**で計算されたHPを使用します。
-    * **ZA補正係数**: 現在判明しているレイドボス補正（2868/4096）を暫定的に採用しています。
+    * **ZA補正係数**: 現在判明しているレイドボス補正（2868/4096）を暫定的に採用しています。「ZA補正係数フィッティング」で実測ダメージと照合できます。
     """)
 
 if __name__ == '__main__':
@@ -0,0 +1,35 @@
+"""
+計算ログ (DAMAGE_CALC_LOG) を現在の計算エンジンで再実行し、差分と処理速度を表示する。
+
+    DAMAGE_CALC_LOG=calc_log.jsonl streamlit run damage_calc.py   # 記録
+    python replay_calc_log.py calc_log.jsonl                        # リプレイ
+"""
+import sys
+
+import damage_calc as dc
+
+
+def main(paths):
+    exit_code = 0
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            report = dc.replay_calculation_log(f)
+        per_second = report['count'] / report['seconds'] if report['seconds'] else float('inf')
+        print(f"[{path}] {report['count']:,} 件を {report['seconds']:.3f} 秒で再計算 ({per_second:,.0f} 件/秒)")
+        for line_no, message in report['errors']:
+            print(f"  {line_no}行目: {message}")
+        for line_no, kind, args, expected, actual in report['diffs']:
+            print(f"  {line_no}行目 ({kind}): 入力 {args}\n    記録: {expected}\n    現在: {actual}")
+        if report['n_diffs'] > len(report['diffs']):
+            print(f"  ...ほか {report['n_diffs'] - len(report['diffs']):,} 件の差分")
+        print(f"  差分 {report['n_diffs']:,} 件 / エラー {len(report['errors']):,} 件")
+        if report['n_diffs'] or report['errors']:
+            exit_code = 1
+    return exit_code
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(2)
+    sys.exit(main(sys.argv[1:]))